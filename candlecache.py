@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Persistent on-disk storage of the candles received from the exchanges.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Persistent on-disk storage of the candles received from the exchanges
+"""
+
+__all__ = ["CandleCache"]
+
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+
+class CandleCache:
+    """SQLite backed candle store keyed by exchange, symbol and timeframe.
+
+    The candles are stored as the raw ccxt ohlcv lists with the timestamp in ms.
+    Every thread gets its own connection, sqlite connections can't be shared.
+    """
+    __SCHEMA = """CREATE TABLE IF NOT EXISTS candles (
+                      exchange  TEXT NOT NULL,
+                      symbol    TEXT NOT NULL,
+                      timeframe TEXT NOT NULL,
+                      date      INTEGER NOT NULL,
+                      open      REAL,
+                      high      REAL,
+                      low       REAL,
+                      close     REAL,
+                      volume    REAL,
+                      PRIMARY KEY (exchange, symbol, timeframe, date)
+                  ) WITHOUT ROWID"""
+
+    def __init__(self, fileName: Optional[str] = None):
+        if fileName is None:
+            fileName = os.path.expanduser("~/.local/share/denario/candles.sqlite")
+        directory = os.path.dirname(fileName)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__fileName = fileName
+        self.__local = threading.local()
+
+        with self.__connection as connection:
+            connection.execute(self.__SCHEMA)
+
+    @property
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.__fileName, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def LastTimestamp(self, exchange: str, symbol: str, timeframe: str) -> Optional[int]:
+        """Timestamp in ms of the newest stored candle or None when nothing is stored"""
+        row = self.__connection.execute("SELECT MAX(date) FROM candles "
+                                        "WHERE exchange=? AND symbol=? AND timeframe=?",
+                                        (exchange, symbol, timeframe)).fetchone()
+        return row[0]
+
+    def Store(self, exchange: str, symbol: str, timeframe: str, ohlcv: List[List]) -> None:
+        """Store the candles, already stored candles are overwritten (the last one is still open)"""
+        if not ohlcv:
+            return
+        with self.__connection as connection:
+            connection.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   ((exchange, symbol, timeframe, *candle[:6]) for candle in ohlcv))
+
+    def Load(self, exchange: str, symbol: str, timeframe: str,
+             since: Optional[int] = None, limit: Optional[int] = None,
+             until: Optional[int] = None) -> List[List]:
+        """Load the stored candles in ascending order.
+
+        :param since: only candles from this timestamp in ms.
+        :param limit: only the newest limit candles (after since).
+        :param until: only candles before this timestamp in ms.
+        """
+        query = ("SELECT date, open, high, low, close, volume FROM candles "
+                 "WHERE exchange=? AND symbol=? AND timeframe=? AND date >= ? AND date < ? "
+                 "ORDER BY date DESC")
+        args = [exchange, symbol, timeframe,
+                since if since is not None else 0,
+                until if until is not None else 2 ** 63 - 1]
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+        rows = self.__connection.execute(query, args).fetchall()
+        rows.reverse()
+        return rows
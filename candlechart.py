@@ -18,18 +18,22 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from PyQt5.uic import loadUi
 from PyQt5.QtWidgets import QWidget
 from PyQt5.QtGui import QColor, QPainter, QPicture
-from PyQt5.QtCore import Qt, QDateTime, QPointF, QRectF, pyqtSlot
+from PyQt5.QtCore import Qt, QDateTime, QRectF, QTimer, pyqtSlot
+import numpy as np
 import pyqtgraph as pg
-from pandas import DataFrame
+from pandas import DataFrame, concat
 
-from denariotrader import DenarioTrader, Exchange
+from denariotrader import BackfillJob, DenarioTrader
 from timeaxis import DateTimeAxisItem
-import pickle
+from rangeindex import RangeExtrema
+from indicators import Columns, IndicatorCache, ParseIndicator
 from config import Config
+from startupprofile import StartupProfile
 
 class TimeFormater:
     @staticmethod
@@ -39,48 +43,282 @@ class TimeFormater:
 
 
 class CandlestickItem(pg.GraphicsObject):
+    """Candles rendered in immutable pre-rendered chunks plus a live tail.
+
+    The chunks are cached per level of detail, the last (aggregated) candle is
+    drawn directly on every paint. Updating the last candle or appending one
+    only re-renders the last chunk. Chunks are numbered from an origin that
+    moves back when older candles are prepended, so those keep their chunks.
+    """
+    # Number of (aggregated) candles per chunk
+    CHUNK = 256
+    # Maximum number of cached chunk pictures
+    MAX_CHUNKS = 512
+
     def __init__(self, data: DataFrame):
         pg.GraphicsObject.__init__(self)
         ## data must have fields: time, open, close, min, max
-        self.data = data
         pallet = Config()['pallet']
         self.__redPen = pg.mkPen(pallet['negative'])
         self.__redBrush = pg.mkBrush(pallet['negative'])
         self.__greenPen = pg.mkPen(pallet['positive'])
         self.__greenBrush = pg.mkBrush(pallet['positive'])
+        # (bucket, chunk index) -> (start, end, QPicture) as absolute candle indices
+        self.__chunks = dict()
+        # absolute index of the first candle, it gets negative when older candles are prepended
+        self.__origin = 0
+
+        self.__SetData(data)
+
+    def __SetData(self, data: DataFrame) -> None:
+        self.data = data
+        # naive datetimes in UTC, the same as Timestamp.timestamp()
+        self.__date = data.date.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        self.__open = data.open.to_numpy(dtype=np.float64, copy=True)
+        self.__high = data.high.to_numpy(dtype=np.float64, copy=True)
+        self.__low = data.low.to_numpy(dtype=np.float64, copy=True)
+        self.__close = data.close.to_numpy(dtype=np.float64, copy=True)
+        self.__interval = self.__date[1] - self.__date[0] if len(self.__date) > 1 else 0.
+        self.__lows = RangeExtrema(self.__low, np.minimum)
+        self.__highs = RangeExtrema(self.__high, np.maximum)
+
+        if len(self.__date):
+            width = self.__interval / 3.
+            self.__bounds = QRectF(self.__date[0] - width, self.__low.min(),
+                                   self.__date[-1] - self.__date[0] + 2 * width,
+                                   self.__high.max() - self.__low.min())
+        else:
+            self.__bounds = QRectF()
+
+    def __Invalidate(self, index: int) -> None:
+        """Drop the chunks that contain candles from (absolute) index onwards"""
+        for key in [key for key in self.__chunks if (key[1] + 1) * self.CHUNK * key[0] > index]:
+            del self.__chunks[key]
+
+    def Update(self, candles: DataFrame) -> None:
+        """Replace the candles from the first date of candles onwards"""
+        date = candles.date.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+        index = int(np.searchsorted(self.__date, date[0]))
+        length = len(self.__date)
+
+        if len(candles) == 1 and index == length - 1 and self.__date[index] == date[0]:
+            # the common case, only the open candle changed: no chunk is touched
+            row = candles.iloc[0]
+            self.data.iloc[index, self.data.columns.get_indexer(candles.columns)] = row.to_numpy()
+            self.__open[index] = row.open
+            self.__high[index] = row.high
+            self.__low[index] = row.low
+            self.__close[index] = row.close
+            self.__lows.Update(index)
+            self.__highs.Update(index)
+            if row.high > self.__bounds.bottom() or row.low < self.__bounds.top():
+                self.prepareGeometryChange()
+                self.__bounds.setTop(min(self.__bounds.top(), row.low))
+                self.__bounds.setBottom(max(self.__bounds.bottom(), row.high))
+        else:
+            self.prepareGeometryChange()
+            self.__SetData(concat([self.data[self.data.date < candles.date.iloc[0]], candles], ignore_index=True))
+            self.__Invalidate(self.__origin + index)
+        self.update()
+
+    def Merge(self, candles: DataFrame) -> None:
+        """Merge the candles into the data, candles already present are replaced"""
+        data = concat([self.data, candles], ignore_index=True)
+        data = data.drop_duplicates(subset='date', keep='last').sort_values('date', ignore_index=True)
+        oldLength = len(self.__date)
+        oldFirst = self.__date[0] if oldLength else None
+        self.prepareGeometryChange()
+        self.__SetData(data)
+
+        prepended = int(np.searchsorted(self.__date, oldFirst)) if oldLength else 0
+        if oldLength and len(self.__date) - prepended == oldLength:
+            # only older candles were added, only the chunks holding the old first candle changed
+            oldOrigin = self.__origin
+            self.__origin -= prepended
+            for key in [key for key in self.__chunks if key[1] * self.CHUNK * key[0] <= oldOrigin]:
+                del self.__chunks[key]
+        else:
+            self.__chunks.clear()
+        self.update()
 
-        self.generatePicture()
+    def MemoryUsage(self) -> int:
+        """Approximate memory used by the candles and the rendered chunks in bytes"""
+        return (int(self.data.memory_usage(index=True).sum()) +
+                sum(values.nbytes for values in (self.__date, self.__open, self.__high, self.__low, self.__close)) +
+                self.__lows.nbytes + self.__highs.nbytes +
+                sum(chunk[2].size() for chunk in self.__chunks.values()))
 
-    def generatePicture(self):
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Sorted timestamps of the candles in seconds"""
+        return self.__date
+
+    def Snap(self, x: float) -> float:
+        """Timestamp of the candle closest to x"""
+        index = int(np.searchsorted(self.__date, x))
+        if index == len(self.__date) or (index > 0 and x - self.__date[index - 1] < self.__date[index] - x):
+            index -= 1
+        return self.__date[index]
+
+    def YRange(self, xMin: float, xMax: float):
+        """Lowest low and highest high of the candles between xMin and xMax, None when there are none"""
+        first = int(np.searchsorted(self.__date, xMin, side='left'))
+        last = int(np.searchsorted(self.__date, xMax, side='right'))
+        if first >= last:
+            return None
+        return self.__lows.Query(first, last), self.__highs.Query(first, last)
+
+    def __LevelOfDetail(self):
+        """Index range of the candles within the view and the bucket size.
+
+        When the candles get narrower than a pixel, bucket candles (a power of 2)
+        are aggregated into one.
+        """
+        length = len(self.__date)
+        view = self.getViewBox()
+        if view is None or length == 0:
+            return 0, length, 1
+
+        xMin, xMax = view.viewRange()[0]
+        pixel = self.pixelWidth()
+        bucket = 1
+        if self.__interval > 0 and pixel > self.__interval:
+            bucket = 2 ** int(np.ceil(np.log2(pixel / self.__interval)))
+
+        first = int(np.searchsorted(self.__date, xMin - self.__interval, side='left'))
+        last = int(np.searchsorted(self.__date, xMax + self.__interval, side='right'))
+        return first, last, bucket
+
+    def viewRangeChanged(self):
+        self.update()
+
+    def __Chunk(self, bucket: int, chunk: int, start: int, end: int) -> QPicture:
+        """Picture of the candles of the chunk from start (the first candle) up to end (the start of the tail)"""
+        key = (bucket, chunk)
+        cached = self.__chunks.get(key)
+        if cached is not None and cached[0] == start and cached[1] == end:
+            return cached[2]
+
+        if len(self.__chunks) >= self.MAX_CHUNKS:
+            # drop the other levels of detail first
+            for other in [other for other in self.__chunks if other[0] != bucket] or list(self.__chunks):
+                del self.__chunks[other]
+
+        picture = self.generatePicture(start, end, bucket)
+        self.__chunks[key] = (start, end, picture)
+        return picture
+
+    def generatePicture(self, first: int, last: int, bucket: int = 1) -> QPicture:
         ## pre-computing a QPicture object allows paint() to run much more quickly,
         ## rather than re-drawing the shapes every time.
-        self.picture = QPicture()
-        painter = QPainter(self.picture)
-        width = (self.data.date[1].timestamp() - self.data.date[0].timestamp()) / 3.
-        for _index, row in self.data.iterrows():
-            if row.open > row.close:
-                painter.setBrush(self.__redBrush)
-                painter.setPen(self.__redPen)
-            else:
-                painter.setBrush(self.__greenBrush)
-                painter.setPen(self.__greenPen)
-            date = row.date.timestamp()
-            painter.drawLine(QPointF(date, row.low), QPointF(date, row.high))
-            painter.drawRect(QRectF(date - width, row.open, width * 2, row.close - row.open))
+        picture = QPicture()
+        painter = QPainter(picture)
+        self.__Draw(painter, *self.__Aggregate(first, last, bucket), bucket * self.__interval / 3.)
         painter.end()
+        return picture
+
+    def __Draw(self, painter: QPainter, date, opens, highs, lows, closes, width: float) -> None:
+        down = opens > closes
+        for mask, pen, brush in ((down, self.__redPen, self.__redBrush),
+                                 (~down, self.__greenPen, self.__greenBrush)):
+            if not mask.any():
+                continue
+            painter.setPen(pen)
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(self.__WickPath(date[mask], lows[mask], highs[mask]))
+            painter.setBrush(brush)
+            painter.drawPath(self.__BodyPath(date[mask], opens[mask], closes[mask], width))
+
+    def __Aggregate(self, first: int, last: int, bucket: int):
+        """The candles from first till last (absolute indices), with every bucket candles combined in one"""
+        start = first - self.__origin
+        end = last - self.__origin
+        date = self.__date[start:end]
+        opens = self.__open[start:end]
+        highs = self.__high[start:end]
+        lows = self.__low[start:end]
+        closes = self.__close[start:end]
+        if bucket == 1 or len(date) == 0:
+            return date, opens, highs, lows, closes
+
+        # the buckets start on multiples of bucket, only the first and last can be partial
+        starts = np.arange((-first) % bucket, len(date), bucket)
+        if len(starts) == 0 or starts[0] != 0:
+            starts = np.r_[0, starts]
+        sizes = np.diff(np.r_[starts, len(date)])
+        return (date[starts] + (sizes - 1) * self.__interval / 2.,
+                opens[starts],
+                np.maximum.reduceat(highs, starts),
+                np.minimum.reduceat(lows, starts),
+                closes[starts + sizes - 1])
+
+    @staticmethod
+    def __WickPath(date: np.ndarray, lows: np.ndarray, highs: np.ndarray):
+        """One path with a separate line from low to high for every candle"""
+        x = np.repeat(date, 2)
+        y = np.column_stack((lows, highs)).ravel()
+        connect = np.tile(np.array([1, 0], dtype=np.int32), len(date))
+        return pg.arrayToQPath(x, y, connect=connect)
+
+    @staticmethod
+    def __BodyPath(date: np.ndarray, opens: np.ndarray, closes: np.ndarray, width: float):
+        """One path with a separate closed rectangle from open to close for every candle"""
+        left = date - width
+        right = date + width
+        x = np.column_stack((left, right, right, left, left)).ravel()
+        y = np.column_stack((opens, opens, closes, closes, opens)).ravel()
+        connect = np.tile(np.array([1, 1, 1, 1, 0], dtype=np.int32), len(date))
+        return pg.arrayToQPath(x, y, connect=connect)
 
     def paint(self, p, *args):
-        p.drawPicture(0, 0, self.picture)
+        length = len(self.__date)
+        if length == 0:
+            return
+        if not StartupProfile.finished:
+            StartupProfile.Finish("first chart paint")
+        origin = self.__origin
+        first, last, bucket = self.__LevelOfDetail()
+        first += origin
+        last += origin
+        # the tail is the (aggregated) candle that holds the last candle
+        tail = max(origin + length - 1 - (origin + length - 1) % bucket, origin)
+        chunkSize = self.CHUNK * bucket
+        for chunk in range(first // chunkSize, min(last, tail) // chunkSize + 1):
+            start = max(chunk * chunkSize, origin)
+            end = min((chunk + 1) * chunkSize, tail)
+            if start < end:
+                p.drawPicture(0, 0, self.__Chunk(bucket, chunk, start, end))
+
+        if last > tail:
+            self.__Draw(p, *self.__Aggregate(tail, origin + length, bucket), bucket * self.__interval / 3.)
 
     def boundingRect(self):
         ## boundingRect _must_ indicate the entire area that will be drawn on
         ## or else we will get artifacts and possibly crashing.
-        ## (in this case, QPicture does all the work of computing the bouning rect for us)
-        return QRectF(self.picture.boundingRect())
+        ## Only a part is rendered at once, so use the bounds of all candles.
+        return QRectF(self.__bounds)
+
+
+class ChartState:
+    """A chart of another symbol or timeframe, kept to show it again without loading or rendering it"""
+
+    def __init__(self, candles: CandlestickItem, viewRange, historyExhausted: bool):
+        self.candles = candles
+        self.viewRange = viewRange
+        self.historyExhausted = historyExhausted
+        self.memoryUsage = candles.MemoryUsage()
 
 
 class CandleChart(QWidget):
     limit = 1000
+    # Start loading older candles when the view gets within this many view widths of the first candle
+    PREFETCH = 1.
+    # Height in pixels of the panes below the candles (volume, rsi, ...)
+    PANE_HEIGHT = 120
+    # Memory budget in bytes of the charts kept for switching back to them
+    CACHE_BYTES = 64 * 1024 * 1024
+    # Longest delay in ms before a failed scroll-back is tried again, it starts at DenarioTrader.RETRY_INTERVAL
+    MAX_RETRY_INTERVAL = 10 * 60 * 1000
 
     def __init__(self, parent=None):
         # Initialize UI
@@ -94,6 +332,18 @@ class CandleChart(QWidget):
         self.__trader = DenarioTrader.GetInstance()
         self.__exchange = self.__trader.exchange
         self.__trader.exchangeChanged.connect(self.OnExchangeChanged)
+        self.__trader.ohlcvReceived.connect(self.OnOhlcvReceived)
+        self.__trader.candlesUpdated.connect(self.OnCandlesUpdated)
+        self.__trader.backfillReceived.connect(self.OnBackfillReceived)
+        self.__trader.backfillFinished.connect(self.OnBackfillFinished)
+        self.__backfill = None
+        self.__backfillFirst = None
+        self.__historyExhausted = False
+        # a failed scroll-back is tried again after a delay that doubles on every failure
+        self.__retryInterval = 0
+        self.__retryTimer = QTimer(self)
+        self.__retryTimer.setSingleShot(True)
+        self.__retryTimer.timeout.connect(self.__ScrollBack)
 
         self.__timeAxis = DateTimeAxisItem(self.timeDelta, orientation='bottom')
         self.__legends = self.gpvChart.addLegend(offset=(600, 10))
@@ -123,39 +373,279 @@ class CandleChart(QWidget):
         #self.gpvChart.setState({'autoVisibleOnly': [False, True]})
 
         self.__currentCandles = None
+        # (exchange, symbol, timeframe) of the shown candles
+        self.__chartKey = None
+        # (exchange, symbol, timeframe) -> ChartState, the least recently shown first
+        self.__charts = OrderedDict()
+
+        self.__indicatorCache = IndicatorCache()
+        self.__indicators = None
+        # pane name -> PlotItem, the candles are in the 'price' pane
+        self.__panes = {'price': self.__plotItem}
+        # indicator -> {line: item}
+        self.__indicatorItems = dict()
+        for text in Config()['denario'].get('indicators', ["Volume"]):
+            self.__AddIndicatorItems(ParseIndicator(text))
 
         self.ChangedTimeframe("1 hour")
 
+    def __Pane(self, name: str):
+        """PlotItem of the pane, a pane below the candles is created on first use"""
+        pane = self.__panes.get(name)
+        if pane is None:
+            widget = pg.PlotWidget(self)
+            widget.setMaximumHeight(self.PANE_HEIGHT)
+            pane = widget.getPlotItem()
+            pane.setXLink(self.__plotItem)
+            pane.setMouseEnabled(x=False, y=False)
+            pane.setAutoVisible(y=True)
+            pane.enableAutoRange(y=True)
+            pane.showAxis("right", True)
+            pane.showAxis("left", False)
+            pane.showAxis("bottom", False)
+            pane.showGrid(x=True, y=True)
+            self.gridLayout.addWidget(widget, len(self.__panes) + 1, 1)
+            self.__panes[name] = pane
+        return pane
+
+    def __AddIndicatorItems(self, indicator) -> None:
+        pane = self.__Pane(indicator.pane)
+        pallet = Config()['pallet']
+        color = pg.intColor(len(self.__indicatorItems), hues=8)
+        items = dict()
+        # the value of the last candle is drawn by a separate tail item, so a streamed update only changes the tail
+        for line in indicator.lines:
+            if line in indicator.bars:
+                # one item per color and the tail
+                items[line] = (pg.BarGraphItem(x=[], height=[], width=1, pen=None, brush=pallet['positive']),
+                               pg.BarGraphItem(x=[], height=[], width=1, pen=None, brush=pallet['negative']),
+                               pg.BarGraphItem(x=[], height=[], width=1, pen=None, brush=pallet['positive']))
+            else:
+                name = indicator.name if line == indicator.lines[0] else None
+                items[line] = (pg.PlotDataItem(pen=color, name=name, connect='finite'),
+                               pg.PlotDataItem(pen=color, connect='finite'))
+                items[line][0].setClipToView(True)
+            for item in items[line]:
+                pane.addItem(item)
+        self.__indicatorItems[indicator] = items
+
+    def __ShowIndicators(self) -> None:
+        """Pass the indicator values to their items"""
+        if self.__indicators is None:
+            return
+        dates = self.__indicators.dates
+        width = (dates[1] - dates[0]) * 2. / 3. if len(dates) > 1 else 1.
+        for indicator, items in self.__indicatorItems.items():
+            values = self.__indicators.Values(indicator.key)
+            for line, item in items.items():
+                if line in indicator.bars:
+                    rising = indicator.Rising(self.__indicators.candles, values[line])[:-1]
+                    valid = np.isfinite(values[line][:-1])
+                    for mask, bars in ((rising & valid, item[0]), (~rising & valid, item[1])):
+                        bars.setOpts(x=dates[:-1][mask], height=values[line][:-1][mask], width=width)
+                else:
+                    item[0].setData(dates[:-1], values[line][:-1])
+        self.__ShowTail()
+
+    def __ShowTail(self) -> None:
+        """Pass the indicator values of the last candle to the tail items"""
+        dates = self.__indicators.dates
+        if len(dates) == 0:
+            return
+        width = (dates[1] - dates[0]) * 2. / 3. if len(dates) > 1 else 1.
+        candles = self.__indicators.candles
+        last = Columns(candles.names, [candles[name][-1:] for name in candles.names])
+        pallet = Config()['pallet']
+        for indicator, items in self.__indicatorItems.items():
+            values = self.__indicators.Values(indicator.key)
+            for line, item in items.items():
+                if line in indicator.bars:
+                    value = values[line][-1:]
+                    rising = indicator.Rising(last, value)[0]
+                    valid = np.isfinite(value)
+                    item[2].setOpts(x=dates[-1:][valid], height=value[valid], width=width,
+                                    brush=pallet['positive'] if rising else pallet['negative'])
+                else:
+                    item[1].setData(dates[-2:], values[line][-2:])
+
     @pyqtSlot(str)
     def UpdateSymbol(self, symbol : str = None) -> None:
+        """Request the candles of the symbol, the current candles stay visible until they are received"""
         print(f"UpdateSymbol: {symbol}")
         if symbol is not None:
             self.symbol = symbol
 
-        if self.__currentCandles is not None:
-            self.gpvChart.removeItem(self.__currentCandles)
-            self.__currentCandles = None
-
-        ohlcv = self.__trader.GetOhlcv(self.symbol, timeframe=self.timeFrame, limit=self.limit)
-        if self.__exchange is not None:
-            precision = self.__exchange.markets[self.symbol]['precision']['price']
-            self.__hCrossLine.label.setFormat(f"{{value:.{precision}f}}")
-
-            self.__currentCandles = CandlestickItem(ohlcv)
-            self.gpvChart.addItem(self.__currentCandles)
-            xMin = ohlcv.date.iloc[0].timestamp()
-            xMax = ohlcv.date.iloc[-1].timestamp()
-            xDelta = (xMax - xMin) * 0.02
-            yMin = ohlcv.low.min()
-            yMax = ohlcv.high.max()
-            yDelta = (yMax - yMin) * 0.2
-            self.__plotItem.setLimits(xMin=xMin - xDelta,
-                                      xMax=xMax + xDelta,
-                                      yMin=yMin - yDelta,
-                                      yMax=yMax + yDelta)
-            self.OnAutoZoom()
-
-    @pyqtSlot(Exchange)
+        if self.__backfill is not None:
+            self.__backfill.Cancel()
+            self.__backfill = None
+        self.__retryTimer.stop()
+        self.__retryInterval = 0
+
+        if self.symbol is not None and self.__exchange is not None:
+            key = (self.__exchange.id, self.symbol, self.timeFrame)
+            if key != self.__chartKey and key in self.__charts:
+                self.__RestoreChart(key)
+            # also for a restored chart, it only receives the candles it misses
+            self.__trader.RequestOhlcv(self.symbol, timeframe=self.timeFrame, limit=self.limit)
+
+    def __StashChart(self) -> None:
+        """Keep the shown chart for when its symbol and timeframe are shown again"""
+        if self.__currentCandles is None:
+            return
+
+        self.gpvChart.removeItem(self.__currentCandles)
+        if self.__chartKey is not None:
+            self.__charts[self.__chartKey] = ChartState(self.__currentCandles, self.__plotItem.viewRange()[0],
+                                                        self.__historyExhausted)
+            self.__charts.move_to_end(self.__chartKey)
+            total = sum(state.memoryUsage for state in self.__charts.values())
+            while total > self.CACHE_BYTES:
+                _key, state = self.__charts.popitem(last=False)
+                total -= state.memoryUsage
+        self.__currentCandles = None
+        self.__chartKey = None
+
+    def __RestoreChart(self, key) -> None:
+        self.__StashChart()
+        state = self.__charts.pop(key)
+        self.__chartKey = key
+        self.__currentCandles = state.candles
+        self.__historyExhausted = state.historyExhausted
+        self.gpvChart.addItem(self.__currentCandles)
+        self.__ShowChart(key)
+        self.__plotItem.setXRange(*state.viewRange, padding=0.)
+
+    def __ShowChart(self, key) -> None:
+        """Show the indicators and limits of the current candles"""
+        exchId, symbol, timeframe = key
+        precision = self.__exchange.markets[symbol]['precision']['price']
+        self.__hCrossLine.label.setFormat(f"{{value:.{precision}f}}")
+        self.__indicators = self.__indicatorCache.Get(exchId, symbol, timeframe, self.__currentCandles.data)
+        for indicator in self.__indicatorItems:
+            self.__indicators.Add(indicator)
+        self.__ShowIndicators()
+        self.__UpdateLimits()
+
+    @pyqtSlot(str, str, DataFrame)
+    def OnOhlcvReceived(self, symbol: str, timeframe: str, ohlcv: DataFrame) -> None:
+        if symbol != self.symbol or timeframe != self.timeFrame or self.__exchange is None or len(ohlcv) < 2:
+            # an answer on an outdated request
+            return
+
+        key = (self.__exchange.id, symbol, timeframe)
+        if key == self.__chartKey and self.__currentCandles is not None and \
+           ohlcv.date.iloc[0] <= self.__currentCandles.data.date.iloc[-1]:
+            # the shown (restored) chart only misses the newest candles
+            self.OnCandlesUpdated(symbol, timeframe, ohlcv[ohlcv.date >= self.__currentCandles.data.date.iloc[-1]])
+            self.__trader.WatchOhlcv(self.symbol, self.timeFrame)
+            self.__ScrollBack()
+            return
+
+        StartupProfile.Mark("candles")
+        self.__StashChart()
+        self.__charts.pop(key, None)
+        self.__chartKey = key
+        self.__currentCandles = CandlestickItem(ohlcv)
+        self.__historyExhausted = False
+        self.gpvChart.addItem(self.__currentCandles)
+        self.__ShowChart(key)
+        self.OnAutoZoom()
+        self.__trader.WatchOhlcv(self.symbol, self.timeFrame)
+
+        historyDays = Config()['denario'].get('historyDays', 0)
+        since = datetime.utcnow() - timedelta(days=historyDays)
+        if historyDays and self.__backfill is None and ohlcv.date.iloc[0] > since:
+            self.__backfillFirst = self.__currentCandles.timestamps[0]
+            self.__backfill = self.__trader.Backfill(self.symbol, self.timeFrame,
+                                                     int(since.replace(tzinfo=timezone.utc).timestamp() * 1000),
+                                                     int(ohlcv.date.iloc[0].timestamp() * 1000))
+        else:
+            self.__ScrollBack()
+
+    @pyqtSlot(BackfillJob, DataFrame)
+    def OnBackfillReceived(self, job: BackfillJob, candles: DataFrame) -> None:
+        """A page of history arrived, the chart stays usable while the other pages are loaded"""
+        if job is not self.__backfill or self.__currentCandles is None:
+            return
+
+        self.__currentCandles.Merge(candles)
+        self.__indicators.Reset(self.__currentCandles.data)
+        self.__ShowIndicators()
+        self.__UpdateLimits()
+
+    @pyqtSlot(BackfillJob)
+    def OnBackfillFinished(self, job: BackfillJob) -> None:
+        if job is not self.__backfill:
+            return
+
+        self.__backfill = None
+        if job.failed:
+            # e.g. offline or rate limited, try again later
+            self.__retryInterval = min(max(2 * self.__retryInterval, DenarioTrader.RETRY_INTERVAL),
+                                       self.MAX_RETRY_INTERVAL)
+            self.__retryTimer.start(self.__retryInterval)
+            return
+
+        self.__retryInterval = 0
+        if self.__currentCandles is not None and self.__currentCandles.timestamps[0] >= self.__backfillFirst:
+            # every page arrived without anything older, this is where the history of the symbol starts
+            self.__historyExhausted = True
+        self.__ScrollBack()
+
+    def __ScrollBack(self) -> None:
+        """Load the previous page of history when the view gets close to the first candle"""
+        if self.__currentCandles is None or self.__historyExhausted or self.__retryTimer.isActive() or \
+           (self.__backfill is not None and not self.__backfill.finished):
+            return
+
+        xMin, xMax = self.__plotItem.viewRange()[0]
+        timestamps = self.__currentCandles.timestamps
+        first = timestamps[0]
+        if xMin - (xMax - xMin) * self.PREFETCH > first:
+            return
+
+        interval = timestamps[1] - timestamps[0]
+        candles = max(self.limit, int(self.PREFETCH * (xMax - xMin) / interval))
+        until = int(first * 1000)
+        self.__backfillFirst = first
+        self.__backfill = self.__trader.Backfill(self.symbol, self.timeFrame,
+                                                 until - int(candles * interval * 1000), until,
+                                                 pageSize=self.limit)
+
+    @pyqtSlot(str, str, DataFrame)
+    def OnCandlesUpdated(self, symbol: str, timeframe: str, candles: DataFrame) -> None:
+        """Streamed changes of the last candle(s)"""
+        if symbol != self.symbol or timeframe != self.timeFrame or self.__currentCandles is None or candles.empty:
+            return
+
+        self.__currentCandles.Update(candles)
+        length = len(self.__indicators.dates)
+        if not self.__indicators.Update(candles):
+            self.__indicators.Reset(self.__currentCandles.data)
+            self.__ShowIndicators()
+        elif len(self.__indicators.dates) != length:
+            # a new candle, the previous last candle moves from the tail to the other items
+            self.__ShowIndicators()
+        else:
+            self.__ShowTail()
+        self.__UpdateLimits()
+
+    def __UpdateLimits(self):
+        # the candles keep their bounds up to date, so this doesn't depend on the number of candles
+        timestamps = self.__currentCandles.timestamps
+        bounds = self.__currentCandles.boundingRect()
+        xMin = timestamps[0]
+        xMax = timestamps[-1]
+        xDelta = (xMax - xMin) * 0.02
+        yMin = bounds.top()
+        yMax = bounds.bottom()
+        yDelta = (yMax - yMin) * 0.2
+        self.__plotItem.setLimits(xMin=xMin - xDelta,
+                                  xMax=xMax + xDelta,
+                                  yMin=yMin - yDelta,
+                                  yMax=yMax + yDelta)
+
+    @pyqtSlot(object)
     def OnExchangeChanged(self, exchange):
         print(f"OnExchangeChanged: {exchange}")
         self.__exchange = exchange
@@ -177,11 +667,8 @@ class CandleChart(QWidget):
         if self.__currentCandles is not None:
             mousepoint = self.__plotItem.vb.mapSceneToView(evt[0])
 
-            crossTime = datetime.fromtimestamp(mousepoint.x())
-            # pick the closest value in the current timeDelta
-            crossTime = min(self.__currentCandles.data.date, key=lambda x: abs(x - crossTime))
-
-            self.__vCrossLine.setPos(crossTime.timestamp())
+            # pick the closest candle
+            self.__vCrossLine.setPos(self.__currentCandles.Snap(mousepoint.x()))
             self.__hCrossLine.setPos(mousepoint.y())
 
     def OnAutoZoom(self, toggled=None):
@@ -190,15 +677,15 @@ class CandleChart(QWidget):
             if self.__currentCandles is not None:
                 self.btnAutoZoom.setStyleSheet("color: green;")
                 ranges = self.__plotItem.viewRange()
-                xMin = datetime.fromtimestamp(ranges[0][0])
-                xMax = datetime.fromtimestamp(ranges[0][1])
-                data = self.__currentCandles.data.where((self.__currentCandles.data.date >= xMin) & (self.__currentCandles.data.date <= xMax))
-                self.__plotItem.setYRange(data.low.min(), data.high.max())
+                yRange = self.__currentCandles.YRange(*ranges[0])
+                if yRange is not None:
+                    self.__plotItem.setYRange(*yRange)
         else:
             self.btnAutoZoom.setStyleSheet("color: white;")
 
     def OnXRangeChanged(self, plotItem, xRange):
         self.OnAutoZoom()
+        self.__ScrollBack()
 
     def wheelEvent(self, event):
         yAngle = event.angleDelta().y()
@@ -234,6 +721,7 @@ class CandleChart(QWidget):
 
         self.__timeFrame = f"{number}{frame}"
         self.__deltaTime = dTime
+        self.__timeAxis.timeFrame = dTime
         self.UpdateSymbol()
 
     @property
@@ -27,8 +27,12 @@ import json
 import os
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QCoreApplication, QTimer
 from PyQt5.QtGui import QColor
 
+from startupprofile import StartupProfile
+
 __version__ = "0.0.0"
 
 def _ShowLicense():
@@ -47,10 +51,67 @@ class ConfigJSONEncoder(json.JSONEncoder):
         # Let the base class default method raise the TypeError
         return json.JSONEncoder.default(self, o)
 
+class _ConfigWriter:
+    """Writes the configuration in the background, at most once per DELAY ms.
+
+    The changes within DELAY ms are written at once, the JSON text is made on
+    the GUI thread (the configuration isn't locked) and written by a single
+    thread, so the writes are done in order. The file is replaced by a
+    completely written temporary file, a crash can't leave a truncated file.
+    """
+    DELAY = 500
+
+    def __init__(self):
+        self.__timer = None
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ConfigWriter")
+        # function that returns the file name and the text to write when there are changes
+        self.__save = None
+        self.__pending = None
+
+    def Schedule(self, save) -> None:
+        """:param save: function that returns the file name and the text to write"""
+        self.__save = save
+        if QCoreApplication.instance() is None:
+            # no event loop (yet), e.g. when the configuration is created at the start
+            self.Flush()
+            return
+        if self.__timer is None:
+            self.__timer = QTimer()
+            self.__timer.setSingleShot(True)
+            self.__timer.timeout.connect(self.__Write)
+        if not self.__timer.isActive():
+            self.__timer.start(self.DELAY)
+
+    def Flush(self) -> None:
+        """Write the scheduled changes now and wait until they are on disk"""
+        if self.__timer is not None:
+            self.__timer.stop()
+        self.__Write()
+        if self.__pending is not None:
+            self.__pending.result()
+
+    def __Write(self) -> None:
+        save, self.__save = self.__save, None
+        if save is not None:
+            self.__pending = self.__executor.submit(self.__WriteFile, *save())
+
+    @staticmethod
+    def __WriteFile(fileName: str, text: str) -> None:
+        """Runs in the writer thread"""
+        os.makedirs(os.path.dirname(os.path.abspath(fileName)), exist_ok=True)
+        tmpName = f"{fileName}.tmp"
+        with open(tmpName, "w") as fp:
+            fp.write(text)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmpName, fileName)
+
+
 class Config:
     """Basic configuration holder"""
     __instance = None
     __configFile = None
+    __writer = None
 
     def __new__(cls):
         if Config.__instance is None:
@@ -60,12 +121,15 @@ class Config:
                                 default=False, help="Run in sandbox mode")
             parser.add_argument("-c", "--config",
                                 help="Set the configuration file")
+            parser.add_argument("--profile-startup", action="store_true", default=False,
+                                help="Print the duration of the phases of the start")
 
             subParser = parser.add_subparsers(help='Sub command help')
             license = subParser.add_parser("license", help="Show the license.")
             license.set_defaults(func=_ShowLicense)
 
             args = parser.parse_args()
+            StartupProfile.enabled = args.profile_startup
 
             if hasattr(args, 'func'):
                 args.func()
@@ -121,6 +185,10 @@ class Config:
     def __CreateEmptyConfig(cls):
         Config.__instance = dict()
         Config.__instance['denario'] = dict(activeExchange="",
+                                            streaming=False,
+                                            historyDays=0,
+                                            indicators=["Volume"],
+                                            favorites={},
                                             symbolbar={})
         Config.__instance['exchanges'] = list()
         Config.__instance['telegram'] = dict(enabled=False,
@@ -130,9 +198,21 @@ class Config:
 
     @classmethod
     def Save(cls):
+        """Save the configuration soon, the changes of a short period are saved at once"""
         if cls.__instance is not None:
-            with open(cls.__configFile, "w") as fp:
-                json.dump(cls.__instance, fp, indent=2, cls=ConfigJSONEncoder)
+            if cls.__writer is None:
+                cls.__writer = _ConfigWriter()
+            cls.__writer.Schedule(cls.__Dump)
+
+    @classmethod
+    def Flush(cls):
+        """Write the saved changes that are still pending, e.g. at shutdown"""
+        if cls.__writer is not None:
+            cls.__writer.Flush()
+
+    @classmethod
+    def __Dump(cls):
+        return cls.__configFile, json.dumps(cls.__instance, indent=2, cls=ConfigJSONEncoder)
 
     def __getitem__(self, key):
         pass
@@ -20,6 +20,9 @@
 """
 Denario the crypto trading application.
 """
+# first, so the imports are part of the startup profile
+from startupprofile import StartupProfile
+
 import argparse
 import os
 import sys
@@ -27,7 +30,7 @@ import warnings
 import pyqtgraph as pg
 from PyQt5 import QtCore, QtGui, uic
 from PyQt5.QtCore import QFile, QTextStream, pyqtSlot, QSignalMapper
-from PyQt5.QtWidgets import QApplication, QMainWindow, QAction
+from PyQt5.QtWidgets import QApplication, QMainWindow, QAction, QLabel
 from PyQt5.uic import loadUi
 import qdarkstyle
 
@@ -36,6 +39,8 @@ from about import AboutDlg
 from exchangeedit import ExchangeEditDlg
 from config import Config
 
+StartupProfile.Mark("imports")
+
 class Denario(QMainWindow):
     """Denario application, main window."""
     def __init__(self, config, parent=None):
@@ -44,6 +49,14 @@ class Denario(QMainWindow):
         loadUi(os.path.join(os.path.abspath(os.path.dirname(__file__)), "denario.ui"), self)
 
         self.__trader = DenarioTrader.GetInstance()
+        self.__trader.exchangeChanged.connect(self.OnExchangeChanged)
+        self.__trader.staleChanged.connect(self.OnStaleChanged)
+        self.__trader.exchangeFailed.connect(self.statusbar.showMessage)
+        # marks the data of the last session, as long as no fresh data has been received
+        self.lblStale = QLabel()
+        self.lblStale.setStyleSheet(f"QLabel {{ color : {config['pallet']['negative'].name()}; }}")
+        self.lblStale.hide()
+        self.statusbar.addPermanentWidget(self.lblStale)
         self.wgtSelectSymbol.symbolSelected.connect(self.wgtBar.OnShowSymbol)
         self.wgtBar.symbolChanged.connect(self.wgtChart.UpdateSymbol)
         print("showing")
@@ -61,6 +74,9 @@ class Denario(QMainWindow):
         self.exchangeMapper = QSignalMapper(self)
         self.exchangeMapper.mapped[str].connect(self.OnSelectExchange)
         self.MenuAddAllExchanges()
+        activeExchange = Config()['denario']['activeExchange']
+        if self.__trader.exchange is None and activeExchange in self.__trader.exchanges:
+            self.statusbar.showMessage(f"Loading {self.__trader.exchanges[activeExchange]['name']}...")
 
     def MenuAddAllExchanges(self):
         # first clear out all old actions
@@ -106,6 +122,8 @@ class Denario(QMainWindow):
         dlg = ExchangeEditDlg(self)
         dlg.exec()
         self.MenuAddAllExchanges()
+        # index the markets of added exchanges
+        self.__trader.RefreshMarkets()
 
     @pyqtSlot(str)
     def OnSelectExchange(self, name):
@@ -120,14 +138,33 @@ class Denario(QMainWindow):
         for exchange in self.__trader.exchanges.values():
             if exchange['name'] == name:
                 Config()['denario']['activeExchange'] = exchange['id']
+                self.statusbar.showMessage(f"Loading {name}...")
                 self.__trader.ReloadExchange()
                 break
         else:
             raise Exception(f"Exchange id for '{name}' not found")
 
+    @pyqtSlot(object)
+    def OnExchangeChanged(self, exchange):
+        self.statusbar.clearMessage()
+
+    @pyqtSlot(bool)
+    def OnStaleChanged(self, stale):
+        title = self.windowTitle().replace(" (last session)", "")
+        if stale:
+            since = QtCore.QDateTime.fromSecsSinceEpoch(int(self.__trader.staleSince))
+            self.lblStale.setText(f"Showing the last session of {since.toString('yyyy-MM-dd hh:mm')}, refreshing...")
+            title += " (last session)"
+        else:
+            # e.g. the message of a failed attempt
+            self.statusbar.clearMessage()
+        self.lblStale.setVisible(stale)
+        self.setWindowTitle(title)
+
 
 def Main():
     config = Config()
+    StartupProfile.Mark("config")
 
     QtCore.QCoreApplication.setAttribute(QtCore.Qt.AA_X11InitThreads)
     app = QApplication(sys.argv)
@@ -142,10 +179,13 @@ def Main():
     # Enable antialiasing for prettier plots
     pg.setConfigOptions(antialias=True)
     #pg.setConfigOptions(useOpenGL=True) # borders don't match candles in openGL....
+    StartupProfile.Mark("application")
 
     DenarioTrader.StartUp(config)
+    StartupProfile.Mark("trader")
     try:
         denario = Denario(config)
+        StartupProfile.Mark("window")
 
         # Start Qt event loop unless running in interactive mode or using pyside.
         if (sys.flags.interactive != 1) or not hasattr(QtCore, 'PYQT_VERSION'):
@@ -21,25 +21,80 @@
 Interface to the exchange
 """
 
-__all__ = ["DenarioTrader"]
+from __future__ import annotations
 
-from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+__all__ = ["BackfillJob", "DenarioTrader"]
 
-from typing import Any, Dict
-from datetime import datetime, timedelta
-import ccxt
-from ccxt import Exchange
+from PyQt5.QtCore import QObject, QThreadPool, QTimer, pyqtSignal
+
+from typing import TYPE_CHECKING, Any, Dict, Iterable
+from collections import deque
+import numpy as np
 from pandas import DataFrame, DatetimeIndex, to_datetime
 
 
 from config import Config
+from candlecache import CandleCache
+from exchangecatalog import ExchangeCatalog
+from marketindex import MarketIndex
+from tickerstore import TickerStore
+from streaming import MarketStream, IsStreamingSupported
+from worker import Worker
+from ratelimiter import RateLimiter
+from resample import BucketStart, CanResample, CountBuckets, Resample, ShiftBuckets
+from session import SessionSnapshot
+from startupprofile import StartupProfile
+
+if TYPE_CHECKING:
+    # ccxt is imported when the first exchange is loaded in the thread pool
+    from ccxt import Exchange
+
+
+class BackfillJob:
+    """Bookkeeping of a running backfill, see DenarioTrader.Backfill"""
+    def __init__(self, symbol: str, timeframe: str, pages: int):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.pending = pages
+        # pages that couldn't be fetched (e.g. a network error)
+        self.failed = 0
+        self.cancelled = False
+
+    def Cancel(self) -> None:
+        """Pages that haven't been started yet are skipped"""
+        self.cancelled = True
+
+    @property
+    def finished(self) -> bool:
+        return self.pending == 0
 
 
 class DenarioTrader(QObject):
     """Trader class"""
-    exchangeChanged = pyqtSignal(Exchange)
+    # the ccxt Exchange, None when no exchange is active
+    exchangeChanged = pyqtSignal(object)
+    ohlcvReceived = pyqtSignal(str, str, DataFrame)
+    candlesUpdated = pyqtSignal(str, str, DataFrame)
+    backfillReceived = pyqtSignal(BackfillJob, DataFrame)
+    backfillFinished = pyqtSignal(BackfillJob)
+    # True while the markets, tickers and candles of the last session are shown
+    staleChanged = pyqtSignal(bool)
+    # the error message when the active exchange couldn't be loaded
+    exchangeFailed = pyqtSignal(str)
 
     DEFAULT_DATAFRAME_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+    # Pool priority of the prefetched candles, below the backfill pages
+    PREFETCH_PRIORITY = -2
+    # Ticker refresh interval in ms of all markets and of the focused symbols only
+    TICKERS_INTERVAL = 5 * 60 * 1000
+    FOCUS_INTERVAL = 30 * 1000
+    # Interval in ms of the session snapshot, it's also written at shutdown
+    SESSION_INTERVAL = 5 * 60 * 1000
+    SESSION_PRIORITY = -3
+    # Candles per series in the session snapshot when the chart requested no limit
+    SESSION_CANDLES = 1000
+    # Interval in ms after which the loading of the markets and tickers is retried when it failed
+    RETRY_INTERVAL = 30 * 1000
     __instance = None
 
     @classmethod
@@ -57,26 +112,60 @@ class DenarioTrader(QObject):
             super().__init__()
             DenarioTrader.__instance = self
 
-        self.__exchanges = dict()
-        self.__LoadExchanges()
+        self.__exchanges = ExchangeCatalog()
+        StartupProfile.Mark("catalog")
+        self.__exchange = None
+        self.__tickers = TickerStore(self.TICKERS_INTERVAL, parent=self)
+        # symbols of which the tickers are refreshed, None for all markets
+        self.__focusedTickers = None
+        self.__tickers.refreshDue.connect(self.UpdateTickers)
+        self.__tickersPending = False
+        self.__reloadCount = 0
+        self.__workers = set()
+        self.__pool = QThreadPool(self)
+        self.__pool.setMaxThreadCount(4)
+        self.__candles = CandleCache()
+        self.__stream = None
+        self.__watchedTickers = list()
+        self.__watchedOhlcv = (None, None)
+        self.__rateLimiters = dict()
+        # (exchange id, symbol, timeframe) -> candles returned when the exchange returned less than the limit
+        self.__fullFetches = dict()
+        # requested candles of which the answer hasn't arrived yet
+        self.__pendingRequests = 0
+        # timeframe and limit of the last requested candles, used for the prefetching
+        self.__lastRequest = ('1h', None)
+        self.__prefetchQueue = deque()
+        self.__prefetching = False
+        self.__markets = MarketIndex(self.Submit, parent=self)
+        # the snapshot of the last session is only restored at the start, it's kept while it's shown
+        self.__sessionFile = SessionSnapshot.DefaultFileName()
+        self.__restoreSession = True
+        self.__snapshot = None
+        self.__sessionTimer = QTimer(self)
+        self.__sessionTimer.timeout.connect(lambda: self.__SaveSession(wait=False))
+        self.__sessionTimer.start(self.SESSION_INTERVAL)
         self.ReloadExchange()
 
-        # creating a timer object
-        self.timer = QTimer(self)
-        self.timer.start(301)
-
-    def __LoadExchanges(self):
-        for name in ccxt.exchanges:
-            try:
-                self.__exchanges[name] = getattr(ccxt, name)().describe()
-            except Exception as err:
-                print(f"exchange {name} failed with: {err}")
+    def Submit(self, func, *args, callback=None, errback=None, priority: int = 0, **kwargs) -> Worker:
+        """Run func(*args, **kwargs) in the thread pool.
 
-    def __OnTimer(self):
-        if self.__exchange is not None:
-            self.__exchange.load_markets()
+        callback is called with the result and errback with the exception, both in the GUI thread.
+        Higher priority workers are started first.
+        """
+        worker = Worker(func, *args, **kwargs)
+        self.__workers.add(worker)
+        worker.signals.finished.connect(lambda _result: self.__workers.discard(worker))
+        worker.signals.failed.connect(lambda _err: self.__workers.discard(worker))
+        if callback is not None:
+            worker.signals.finished.connect(callback)
+        if errback is not None:
+            worker.signals.failed.connect(errback)
+        self.__pool.start(worker, priority)
+        return worker
 
     def ReloadExchange(self):
+        """Load the active exchange in the background, exchangeChanged is emitted when it's ready"""
         # configure api key and secret for binance.com
         config = Config()
         activeExchange = config['denario']['activeExchange']
@@ -89,70 +178,544 @@ class DenarioTrader(QObject):
         else:
             exchangeConfig = None
 
+        self.__reloadCount += 1
+        self.__SetSnapshot(None)
+        sessionFile = self.__sessionFile if self.__restoreSession else None
+        self.__restoreSession = False
         if exchangeConfig is not None:
-            exchangeClass = getattr(ccxt, exchangeConfig['id'].lower())
-            exchange = exchangeClass({'apiKey': exchangeConfig['key'],
-                                      'secret': exchangeConfig['secret'],
-                                      'timeout': 30000,
-                                      'enableRateLimit': True})
-            exchange.load_markets()
-
-            # start a worker process to move the received stream_data from the stream_buffer to a print function
-            self.__exchange = exchange
+            reloadCount = self.__reloadCount
+            self.Submit(self.__CreateExchange, dict(exchangeConfig), sessionFile,
+                        callback=lambda result: self.__OnExchangeCreated(reloadCount, *result),
+                        errback=lambda err: self.__OnExchangeFailed(reloadCount, None, err))
         else:
-            self.__exchange = None
+            self.__OnExchangeLoaded(self.__reloadCount, None, dict())
 
-        self.UpdateTickers(True)
+    @staticmethod
+    def __CreateExchange(exchangeConfig: Dict, sessionFile: str):
+        """Runs in the thread pool, so the window is shown while ccxt is imported.
+
+        :return: the exchange and the snapshot of the last session when it's of the same exchange
+        """
+        with StartupProfile.Measure("ccxt import"):
+            import ccxt
+        exchangeClass = getattr(ccxt, exchangeConfig['id'].lower())
+        exchange = exchangeClass({'apiKey': exchangeConfig['key'],
+                                  'secret': exchangeConfig['secret'],
+                                  'timeout': 30000,
+                                  'enableRateLimit': True})
+        snapshot = None
+        if sessionFile is not None:
+            with StartupProfile.Measure("session"):
+                snapshot = SessionSnapshot.Load(sessionFile)
+            if snapshot is not None and snapshot.exchId == exchange.id:
+                exchange.set_markets(snapshot.markets)
+            else:
+                snapshot = None
+        return exchange, snapshot
+
+    @staticmethod
+    def __LoadExchange(exchange: Exchange):
+        """Runs in the thread pool"""
+        with StartupProfile.Measure("markets"):
+            exchange.load_markets(reload=True)
+        with StartupProfile.Measure("tickers"):
+            tickers = exchange.fetchTickers() if exchange.has['fetchTickers'] else dict()
+        return exchange, tickers
+
+    def __OnExchangeCreated(self, reloadCount: int, exchange: Exchange, snapshot: SessionSnapshot):
+        if reloadCount != self.__reloadCount:
+            return
+        # with a snapshot of the last session the chart is painted before these have been loaded
+        StartupProfile.Expect("markets", "tickers")
+        if snapshot is not None:
+            # show the last session while the fresh markets and tickers are loaded
+            self.__SetSnapshot(snapshot)
+            self.__OnExchangeLoaded(reloadCount, exchange, snapshot.tickers)
+        self.__RefreshExchange(reloadCount, exchange)
+
+    def __RefreshExchange(self, reloadCount: int, exchange: Exchange):
+        if reloadCount != self.__reloadCount:
+            return
+        self.Submit(self.__LoadExchange, exchange,
+                    callback=lambda result: self.__OnExchangeRefreshed(reloadCount, *result),
+                    errback=lambda err: self.__OnExchangeFailed(reloadCount, exchange, err))
+
+    def __OnExchangeFailed(self, reloadCount: int, exchange: Exchange, err: Exception):
+        """The exchange couldn't be created (exchange is None) or its markets and tickers couldn't be loaded"""
+        if reloadCount != self.__reloadCount:
+            return
+        if exchange is None:
+            self.__OnExchangeLoaded(reloadCount, None, dict())
+            self.exchangeFailed.emit(f"Loading the exchange failed: {err}")
+        else:
+            self.exchangeFailed.emit(f"Loading {exchange.name} failed: {err}, "
+                                     f"retrying in {self.RETRY_INTERVAL // 1000} seconds")
+            QTimer.singleShot(self.RETRY_INTERVAL, lambda: self.__RefreshExchange(reloadCount, exchange))
+
+    def __OnExchangeRefreshed(self, reloadCount: int, exchange: Exchange, tickers: Dict):
+        if reloadCount != self.__reloadCount:
+            return
+        snapshot = self.__snapshot
+        self.__SetSnapshot(None)
+        if snapshot is None or snapshot.markets.keys() != exchange.markets.keys():
+            # (markets were listed or delisted since the last session) the widgets start over
+            self.__OnExchangeLoaded(reloadCount, exchange, tickers)
+        else:
+            self.__tickers.Update(tickers, replace=True)
+            self.__markets.Set(exchange.id, exchange.markets, tickers)
+
+    def __SetSnapshot(self, snapshot: SessionSnapshot):
+        wasStale = self.__snapshot is not None
+        self.__snapshot = snapshot
+        if wasStale != (snapshot is not None):
+            self.staleChanged.emit(snapshot is not None)
+
+    def __OnExchangeLoaded(self, reloadCount: int, exchange: Exchange, tickers: Dict):
+        if reloadCount != self.__reloadCount:
+            # another exchange has been selected in the meantime
+            return
+        self.__exchange = exchange
+        self.__tickers.Update(tickers, replace=True)
+        if exchange is not None:
+            self.__markets.Set(exchange.id, exchange.markets, tickers)
+        elif not StartupProfile.finished:
+            # no chart is painted, the start ends when the window is shown
+            QTimer.singleShot(0, lambda: StartupProfile.Finish("window shown (no exchange)"))
+        # the subscriptions are renewed by the widgets on exchangeChanged
+        self.__watchedTickers = list()
+        self.FocusTickers(None)
+        self.__watchedOhlcv = (None, None)
+        self.__prefetchQueue.clear()
+        self.__StartStream()
         self.exchangeChanged.emit(self.exchange)
 
+    def __StartStream(self):
+        """(Re)start the websocket stream of the active exchange when streaming is enabled"""
+        if self.__stream is not None:
+            self.__stream.Stop()
+            self.__stream = None
+
+        exchange = self.__exchange
+        if exchange is None or not Config()['denario'].get('streaming', False):
+            return
+        if not IsStreamingSupported(exchange.id):
+            print(f"streaming is not supported for {exchange.id}")
+            return
+
+        self.__stream = MarketStream(exchange.id,
+                                     {'apiKey': exchange.apiKey,
+                                      'secret': exchange.secret,
+                                      'timeout': exchange.timeout,
+                                      'enableRateLimit': True},
+                                     self.__candles, self)
+        self.__stream.tickersReceived.connect(self.__OnStreamTickers)
+        self.__stream.candlesReceived.connect(self.__OnStreamCandles)
+        self.__stream.WatchTickers(self.__StreamedTickers())
+        self.__stream.WatchOhlcv(*self.__watchedOhlcv)
+        self.__stream.start()
+
+    def __StreamedTickers(self):
+        return list(dict.fromkeys(self.__watchedTickers + (self.__focusedTickers or list())))
+
+    def WatchTickers(self, symbols) -> None:
+        """Symbols of which the tickers are streamed (when streaming is enabled)"""
+        self.__watchedTickers = list(symbols)
+        if self.__stream is not None:
+            self.__stream.WatchTickers(self.__StreamedTickers())
+
+    def FocusTickers(self, symbols) -> None:
+        """Only refresh the tickers of symbols (e.g. the favorites), None refreshes all markets.
+
+        The focused tickers and the watched tickers (the tabs) are fetched with
+        a targeted fetchTickers(symbols) more often than all markets, and
+        streamed when streaming is enabled.
+        """
+        focused = list(symbols) if symbols is not None else None
+        if focused == self.__focusedTickers:
+            return
+        self.__focusedTickers = focused
+        self.__tickers.timer.setInterval(self.FOCUS_INTERVAL if focused is not None else self.TICKERS_INTERVAL)
+        if self.__stream is not None:
+            self.__stream.WatchTickers(self.__StreamedTickers())
+        if focused is not None:
+            self.UpdateTickers()
+
+    def WatchOhlcv(self, symbol: str, timeframe: str) -> None:
+        """Candles that are streamed (when streaming is enabled), candlesUpdated is emitted on changes"""
+        self.__watchedOhlcv = (symbol, timeframe)
+        if self.__stream is not None:
+            self.__stream.WatchOhlcv(symbol, timeframe)
+
+    def __OnStreamTickers(self, tickers: Dict):
+        self.__tickers.Update(tickers)
+
+    def __OnStreamCandles(self, symbol: str, timeframe: str, ohlcv: list):
+        self.candlesUpdated.emit(symbol, timeframe, self.__ToDataFrame(ohlcv))
+
     def __Shutdown(self):
         """Shutdown method"""
-        pass
+        if self.__stream is not None:
+            self.__stream.Stop()
+            self.__stream = None
+        self.__pool.clear()
+        self.__pool.waitForDone()
+        self.__sessionTimer.stop()
+        self.__SaveSession(wait=True)
+        Config.Flush()
+
+    def __SaveSession(self, wait: bool):
+        """Write the snapshot of the active exchange, in the background unless wait"""
+        exchange = self.__exchange
+        if exchange is None:
+            return
+        # the series of the tabs at the timeframe of the chart and the series of the chart
+        timeframe, limit = self.__lastRequest
+        limit = limit or self.SESSION_CANDLES
+        series = {(symbol, timeframe) for symbol in self.__watchedTickers}
+        if self.__watchedOhlcv[0] is not None:
+            series.add(self.__watchedOhlcv)
+        # copies, the tickers change in the GUI thread while the snapshot is written
+        args = (self.__sessionFile, exchange.id, dict(exchange.markets), dict(self.__tickers.items()),
+                sorted(series), limit)
+        if wait:
+            self.__WriteSession(*args)
+        else:
+            self.Submit(self.__WriteSession, *args, priority=self.SESSION_PRIORITY)
+
+    def __WriteSession(self, fileName: str, exchId: str, markets: Dict, tickers: Dict, series, limit: int):
+        """Runs in the thread pool or at shutdown"""
+        candles = dict()
+        for symbol, timeframe in series:
+            ohlcv = self.__candles.Load(exchId, symbol, timeframe, limit=limit)
+            if ohlcv:
+                candles[(symbol, timeframe)] = ohlcv
+        SessionSnapshot(exchId, markets, tickers, candles).Save(fileName)
 
     @property
     def exchange(self):
         return self.__exchange
 
     @property
-    def exchanges(self):
+    def staleSince(self):
+        """Time of the shown snapshot of the last session, None when the data is fresh"""
+        return self.__snapshot.created if self.__snapshot is not None else None
+
+    @property
+    def exchanges(self) -> ExchangeCatalog:
+        """Catalog of the exchanges, use exchanges.Describe(exchId) for the full description"""
         return self.__exchanges
 
     @property
-    def tickers(self) -> Dict:
-        return self.UpdateTickers()
-
-    def UpdateTickers(self, force=False):
-        """Updating of the tickers"""
-        if self.__exchange is not None and self.__exchange.has['fetchTickers']:
-            # Only update the tickers once every 5 minutes
-            if force or (datetime.now() - self.__tickersUpdateTime) > timedelta(minutes=5):
-                self.__tickers = self.__exchange.fetchTickers()
-                self.__tickersUpdateTime = datetime.fromtimestamp(next(iter(self.__tickers.values()))['timestamp']/1000)
-        elif force:
-            self.__tickers = dict()
+    def markets(self) -> MarketIndex:
+        """Searchable markets of all configured exchanges, call RefreshMarkets to load them"""
+        return self.__markets
+
+    def RefreshMarkets(self) -> None:
+        """Load the outdated markets of the configured exchanges in the background"""
+        config = Config()
+        self.__markets.Refresh((exchange['id'] for exchange in config['exchanges']),
+                               active=config['denario']['activeExchange'])
 
+    @property
+    def tickers(self) -> TickerStore:
+        """The last received tickers, tickers.tickersChanged reports the changed symbols"""
         return self.__tickers
 
-    def GetOhlcv(self, symbol, *args, **kwargs) -> DataFrame:
+    def UpdateTickers(self):
+        """Updating of the tickers in the background, called on the schedule of the ticker store"""
+        exchange = self.__exchange
+        # while focused the watched tickers are refreshed as well
+        symbols = self.__StreamedTickers() if self.__focusedTickers is not None else None
+        if exchange is not None and exchange.has['fetchTickers'] and not self.__tickersPending and \
+           (symbols is None or symbols):
+            self.__tickersPending = True
+            self.Submit(exchange.fetchTickers, symbols,
+                        callback=lambda tickers: self.__OnTickersReceived(exchange, tickers),
+                        errback=lambda _err: self.__OnTickersReceived(exchange, None))
+
+    def __OnTickersReceived(self, exchange: Exchange, tickers: Dict):
+        self.__tickersPending = False
+        if tickers is not None and exchange is self.__exchange:
+            self.__tickers.Update(tickers)
+
+    def RequestOhlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None,
+                     priority: int = 0) -> None:
+        """Get the candles in the background, ohlcvReceived is emitted with the result"""
+        exchange = self.__exchange
+        if exchange is not None:
+            stored = self.__snapshot.candles.get((symbol, timeframe)) if self.__snapshot is not None else None
+            if since is None and stored:
+                # the candles of the last session until the fresh ones arrive
+                self.ohlcvReceived.emit(symbol, timeframe, self.__ToDataFrame(stored[-limit:] if limit else stored))
+            self.__pendingRequests += 1
+            if since is None:
+                self.__lastRequest = (timeframe, limit)
+            self.Submit(self.__RequestOhlcv, exchange, symbol, timeframe, since, limit, not stored,
+                        priority=priority,
+                        callback=lambda df: self.__OnOhlcvReceived(exchange, symbol, timeframe, df),
+                        errback=lambda _err: self.__OnRequestDone())
+
+    def __RequestOhlcv(self, exchange: Exchange, symbol: str, timeframe: str, since: int, limit: int,
+                       emitCached: bool) -> DataFrame:
+        """Runs in the thread pool.
+
+        The cached (e.g. prefetched) candles are emitted before they are brought
+        up to date, so the chart doesn't wait for the exchange.
         """
+        if since is None and emitCached:
+            cached = self.__candles.Load(exchange.id, symbol, timeframe, limit=limit)
+            duration = exchange.parse_timeframe(timeframe) * 1000
+            # only when the sync continues the cached candles, otherwise they are all replaced
+            recent = cached and (limit is None or (exchange.milliseconds() - cached[-1][0]) // duration < limit)
+            if len(cached) > 1 and recent and exchange is self.__exchange:
+                self.ohlcvReceived.emit(symbol, timeframe, self.__ToDataFrame(cached))
+        return self.__GetOhlcv(exchange, symbol, timeframe, since, limit)
+
+    def __OnOhlcvReceived(self, exchange: Exchange, symbol: str, timeframe: str, df: DataFrame):
+        if exchange is self.__exchange:
+            self.ohlcvReceived.emit(symbol, timeframe, df)
+        self.__OnRequestDone()
+
+    def __OnRequestDone(self):
+        self.__pendingRequests -= 1
+        self.__PrefetchNext()
+
+    def Prefetch(self, symbols: Iterable[str]) -> None:
+        """Warm the candle cache for symbols that are likely requested next.
+
+        The candles are fetched at the timeframe and limit of the last request,
+        one symbol at a time with the lowest priority, only while no requested
+        candles are pending and within the rate limit of the exchange. The
+        symbols replace the ones that are still waiting.
+        """
+        self.__prefetchQueue = deque(dict.fromkeys(symbols))
+        self.__PrefetchNext()
+
+    def __PrefetchNext(self):
+        exchange = self.__exchange
+        if self.__prefetching or self.__pendingRequests or exchange is None:
+            return
+
+        while self.__prefetchQueue:
+            symbol = self.__prefetchQueue.popleft()
+            if symbol in exchange.markets:
+                break
+        else:
+            return
+
+        timeframe, limit = self.__lastRequest
+        self.__prefetching = True
+        self.Submit(self.__Prefetch, exchange, self.__RateLimiter(exchange), symbol, timeframe, limit,
+                    priority=self.PREFETCH_PRIORITY,
+                    callback=lambda _result: self.__OnPrefetched(),
+                    errback=lambda _err: self.__OnPrefetched())
+
+    def __OnPrefetched(self):
+        self.__prefetching = False
+        self.__PrefetchNext()
+
+    def __Prefetch(self, exchange: Exchange, rateLimiter: RateLimiter, symbol: str, timeframe: str, limit: int):
+        """Runs in the thread pool"""
+        last = self.__candles.LastTimestamp(exchange.id, symbol, timeframe)
+        if last is not None and exchange.milliseconds() - last < exchange.parse_timeframe(timeframe) * 1000:
+            # the cached candles are up to date
+            return
+        rateLimiter.Wait()
+        self.__SyncOhlcv(exchange, symbol, timeframe, limit)
+
+    def __RateLimiter(self, exchange: Exchange) -> RateLimiter:
+        """The rate limiter shared by the concurrent background requests to the exchange"""
+        if exchange.id not in self.__rateLimiters:
+            self.__rateLimiters[exchange.id] = RateLimiter(exchange.rateLimit)
+        return self.__rateLimiters[exchange.id]
+
+    def GetOhlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None) -> DataFrame:
+        """
+        Get the candles from the candle cache, only the candles newer than the
+        last stored candle are fetched from the exchange.
+        This call blocks, use RequestOhlcv from the GUI thread.
         :return: DataFrame
         """
         if self.__exchange is not None:
-            ohlcv = self.__exchange.fetchOHLCV(symbol, *args, **kwargs)
-            df = DataFrame(ohlcv, columns=self.DEFAULT_DATAFRAME_COLUMNS)
-
-            df['date'] = to_datetime(df['date'], unit='ms') #, utc=True, infer_datetime_format=True)
-
-            # Some exchanges return int values for Volume and even for OHLC.
-            # Convert them since TA-LIB indicators used in the strategy assume floats
-            # and fail with exception...
-            df = df.astype(dtype={'open': 'float', 'high': 'float', 'low': 'float', 'close': 'float',
-                                  'volume': 'float'})
+            df = self.__GetOhlcv(self.__exchange, symbol, timeframe, since, limit)
         else:
             df = DataFrame([], columns=self.DEFAULT_DATAFRAME_COLUMNS)
 
         return df
 
+    def __GetOhlcv(self, exchange: Exchange, symbol: str, timeframe: str, since: int, limit: int) -> DataFrame:
+        if since is None:
+            ohlcv = None
+            if self.__candles.LastTimestamp(exchange.id, symbol, timeframe) is None:
+                # nothing stored of this timeframe, derive it from a smaller one when possible
+                ohlcv = self.__ResampleOhlcv(exchange, symbol, timeframe, limit)
+            if ohlcv is None:
+                ohlcv = self.__SyncOhlcv(exchange, symbol, timeframe, limit)
+        else:
+            ohlcv = exchange.fetchOHLCV(symbol, timeframe, since, limit)
+            self.__candles.Store(exchange.id, symbol, timeframe, ohlcv)
+        return self.__ToDataFrame(ohlcv)
+
+    def __SyncOhlcv(self, exchange: Exchange, symbol: str, timeframe: str, limit: int):
+        """Bring the cached candles up to date and return the newest limit candles"""
+        exchId = exchange.id
+        duration = exchange.parse_timeframe(timeframe) * 1000
+        now = exchange.milliseconds()
+
+        key = (exchId, symbol, timeframe)
+        last = self.__candles.LastTimestamp(exchId, symbol, timeframe)
+        full = last is None or (limit is not None and (now - last) // duration >= limit)
+        if full:
+            # nothing usable stored, the newest candles are all we need
+            ohlcv = exchange.fetchOHLCV(symbol, timeframe, limit=limit)
+        else:
+            # the last stored candle was most likely still open, so fetch it again
+            ohlcv = exchange.fetchOHLCV(symbol, timeframe, since=last, limit=limit)
+            # exchanges can return less than limit candles per request (e.g. 300), page forward to now
+            current = now - now % duration
+            while ohlcv and ohlcv[-1][0] < current:
+                page = exchange.fetchOHLCV(symbol, timeframe, since=ohlcv[-1][0] + duration, limit=limit)
+                newer = [candle for candle in page if candle[0] > ohlcv[-1][0]]
+                if not newer:
+                    break
+                ohlcv = ohlcv + newer
+        self.__candles.Store(exchId, symbol, timeframe, ohlcv)
+
+        cached = self.__candles.Load(exchId, symbol, timeframe, limit=limit)
+        if not full and limit is not None and len(cached) < min(limit, self.__fullFetches.get(key, limit)) and \
+           (not cached or cached[0][0] > now - limit * duration):
+            # not enough history stored for the requested amount of candles
+            ohlcv = exchange.fetchOHLCV(symbol, timeframe, limit=limit)
+            full = True
+            self.__candles.Store(exchId, symbol, timeframe, ohlcv)
+            cached = self.__candles.Load(exchId, symbol, timeframe, limit=limit)
+        if full and limit is not None and len(ohlcv) < limit:
+            # the exchange has no more candles (a recent listing) or returns less per request
+            self.__fullFetches[key] = len(ohlcv)
+        return cached
+
+    def __ResampleOhlcv(self, exchange: Exchange, symbol: str, timeframe: str, limit: int):
+        """Derive the newest limit candles from the cached candles of a smaller timeframe.
+
+        Only used when the cached candles reach back to the first requested candle.
+        :return: the candles or None when no smaller timeframe covers them
+        """
+        if limit is None or not exchange.timeframes or timeframe not in exchange.timeframes:
+            return None
+
+        exchId = exchange.id
+        now = exchange.milliseconds()
+        since = ShiftBuckets(int(BucketStart([now], timeframe)[0]), timeframe, 1 - limit)
+        sources = [source for source in exchange.timeframes if CanResample(source, timeframe)]
+        # the largest timeframe has the fewest candles to aggregate
+        sources.sort(key=exchange.parse_timeframe, reverse=True)
+
+        for source in sources:
+            last = self.__candles.LastTimestamp(exchId, symbol, source)
+            if last is None or last < since:
+                continue
+            duration = exchange.parse_timeframe(source) * 1000
+            if not self.__candles.Load(exchId, symbol, source, since=since, until=since + duration):
+                # the cached candles don't reach back to the first requested candle, the request
+                # of the candles itself is cheaper than bringing the smaller timeframe up to date
+                continue
+
+            self.__candles.Store(exchId, symbol, source, exchange.fetchOHLCV(symbol, source, since=last))
+            rows = np.array(self.__candles.Load(exchId, symbol, source, since=since), dtype=np.float64)
+            if len(rows) == 0 or rows[-1, 0] < now - 2 * duration:
+                # the gap since the last stored candle was too large for a single request
+                continue
+
+            # only the part without gaps, counted back from the newest candle, can be used
+            gaps = np.flatnonzero(np.diff(rows[:, 0]) != duration)
+            if len(gaps):
+                rows = rows[gaps[-1] + 1:]
+            derived = Resample(rows, timeframe)
+            if rows[0, 0] > derived[0, 0]:
+                # the first candle is incomplete
+                derived = derived[1:]
+            if len(derived) == 0:
+                continue
+
+            ohlcv = derived.tolist()
+            if derived[0, 0] > since:
+                # only the candles before the gap
+                older = exchange.fetchOHLCV(symbol, timeframe, since=since,
+                                            limit=CountBuckets(since, int(derived[0, 0]), timeframe))
+                self.__candles.Store(exchId, symbol, timeframe, older)
+                ohlcv = [candle for candle in older if candle[0] < derived[0, 0]] + ohlcv
+            return ohlcv[-limit:]
+        return None
+
+    def Backfill(self, symbol: str, timeframe: str, since: int, until: int = None,
+                 pageSize: int = 1000) -> BackfillJob:
+        """Get the candles from since until until (timestamps in ms) in the background.
+
+        The range is split in pages of pageSize candles which are fetched
+        concurrently, newest first, within the rate limit of the exchange.
+        Every page is emitted with backfillReceived as soon as it arrives,
+        backfillFinished is emitted after the last one. Pages that are
+        complete in the candle cache aren't fetched again.
+        """
+        exchange = self.__exchange
+        if exchange is None:
+            return None
+
+        duration = exchange.parse_timeframe(timeframe) * 1000
+        if until is None:
+            until = exchange.milliseconds()
+        since -= since % duration
+        starts = list(range(since, until, duration * pageSize))
+        job = BackfillJob(symbol, timeframe, len(starts))
+        rateLimiter = self.__RateLimiter(exchange)
+
+        for start in reversed(starts):
+            end = min(start + duration * pageSize, until)
+            self.Submit(self.__FetchPage, exchange, rateLimiter, job, start, end, duration, priority=-1,
+                        callback=lambda df: self.__OnBackfillPage(exchange, job, df),
+                        errback=lambda _err: self.__OnBackfillPage(exchange, job, None, failed=True))
+        if not starts:
+            self.backfillFinished.emit(job)
+        return job
+
+    def __FetchPage(self, exchange: Exchange, rateLimiter: RateLimiter, job: BackfillJob,
+                    start: int, end: int, duration: int) -> DataFrame:
+        """Runs in the thread pool"""
+        if job.cancelled:
+            return None
+
+        ohlcv = self.__candles.Load(exchange.id, job.symbol, job.timeframe, since=start, until=end)
+        if len(ohlcv) < (end - start) // duration:
+            rateLimiter.Wait()
+            ohlcv = exchange.fetchOHLCV(job.symbol, job.timeframe, since=start, limit=(end - start) // duration)
+            # pages overlap when the exchange returns more than asked for
+            ohlcv = [candle for candle in ohlcv if start <= candle[0] < end]
+            self.__candles.Store(exchange.id, job.symbol, job.timeframe, ohlcv)
+        return self.__ToDataFrame(ohlcv)
+
+    def __OnBackfillPage(self, exchange: Exchange, job: BackfillJob, df: DataFrame, failed: bool = False):
+        job.pending -= 1
+        if failed:
+            job.failed += 1
+        if exchange is not self.__exchange or job.cancelled:
+            return
+        if df is not None and not df.empty:
+            self.backfillReceived.emit(job, df)
+        if job.finished:
+            self.backfillFinished.emit(job)
+
+    def __ToDataFrame(self, ohlcv) -> DataFrame:
+        df = DataFrame(ohlcv, columns=self.DEFAULT_DATAFRAME_COLUMNS)
+
+        df['date'] = to_datetime(df['date'], unit='ms') #, utc=True, infer_datetime_format=True)
+
+        # Some exchanges return int values for Volume and even for OHLC.
+        # Convert them since TA-LIB indicators used in the strategy assume floats
+        # and fail with exception...
+        df = df.astype(dtype={'open': 'float', 'high': 'float', 'low': 'float', 'close': 'float',
+                              'volume': 'float'})
+        return df
+
     @classmethod
     def SelectExchange(cls, newExchange):
             symbolChanged = pyqtSignal(str)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Catalog of the exchanges supported by ccxt.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Catalog of the exchanges supported by ccxt
+"""
+
+__all__ = ["ExchangeCatalog"]
+
+import json
+import os
+from importlib.metadata import version
+from typing import Dict, Optional
+
+
+class ExchangeCatalog(dict):
+    """Compact catalog of all ccxt exchanges: exchange id -> dict(id, name, has).
+
+    The catalog is build once per ccxt version and stored on disk, the full
+    describe() data is only loaded when asked for with Describe.
+    """
+    def __init__(self, fileName: Optional[str] = None):
+        super().__init__()
+        if fileName is None:
+            # the version without importing ccxt, it's only imported to build the catalog
+            fileName = os.path.expanduser(f"~/.local/share/denario/exchanges-{version('ccxt')}.json")
+        self.__described = dict()
+
+        try:
+            with open(fileName, 'r') as fHandle:
+                self.update(json.load(fHandle))
+        except (OSError, ValueError):
+            print(f"building exchange catalog: {fileName}")
+            self.__Build()
+            self.__Save(fileName)
+
+    def __Build(self):
+        import ccxt
+        for name in ccxt.exchanges:
+            try:
+                description = self.__Describe(name)
+            except Exception as err:
+                print(f"exchange {name} failed with: {err}")
+            else:
+                self[name] = dict(id=description['id'],
+                                  name=description['name'],
+                                  has={key: value for key, value in description['has'].items() if value})
+
+    def __Save(self, fileName: str):
+        directory = os.path.dirname(fileName)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmpName = f"{fileName}.tmp"
+        with open(tmpName, 'w') as fHandle:
+            json.dump(self, fHandle)
+        os.replace(tmpName, fileName)
+
+    @staticmethod
+    def __Describe(name: str) -> Dict:
+        import ccxt
+        exchangeClass = getattr(ccxt, name)
+        try:
+            # describe() doesn't use any of the state set by the (heavy) constructor
+            return exchangeClass.__new__(exchangeClass).describe()
+        except Exception:
+            return exchangeClass().describe()
+
+    def Describe(self, exchId: str) -> Dict:
+        """Full description of the exchange, loaded on first use"""
+        if exchId not in self.__described:
+            self.__described[exchId] = self.__Describe(exchId)
+        return self.__described[exchId]
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+#
+# Technical indicators that are kept up to date candle by candle.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Technical indicators that are kept up to date candle by candle
+"""
+
+__all__ = ["Columns", "Indicator", "SMA", "EMA", "RSI", "MACD", "Bollinger", "VWAP", "Volume",
+           "ParseIndicator", "IndicatorSet", "IndicatorCache"]
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from pandas import DataFrame, Series
+
+
+class Columns:
+    """Columns of floats of equal length that grow at the end with amortized constant cost"""
+
+    def __init__(self, names: Iterable[str], columns: Optional[Iterable[np.ndarray]] = None):
+        self.names = tuple(names)
+        columns = list(columns) if columns is not None else [np.empty(0)] * len(self.names)
+        self.__length = len(columns[0]) if columns else 0
+        self.__data = np.full((len(self.names), max(16, 2 * self.__length)), np.nan)
+        for row, column in enumerate(columns):
+            self.__data[row, :self.__length] = column
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.__data[self.names.index(name), :self.__length]
+
+    def Column(self, row: int) -> np.ndarray:
+        return self.__data[row, :self.__length]
+
+    def Set(self, index: int, values: Iterable[float]) -> None:
+        self.__data[:, index] = values
+
+    def Append(self, values: Iterable[float]) -> None:
+        if self.__length == self.__data.shape[1]:
+            data = np.full((len(self.names), 2 * self.__length), np.nan)
+            data[:, :self.__length] = self.__data
+            self.__data = data
+        self.__data[:, self.__length] = values
+        self.__length += 1
+
+
+def _Ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    """Exponential moving average that starts at the first value"""
+    if len(values) == 0:
+        return np.empty(0)
+    return Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _EmaStep(previous: float, value: float, alpha: float) -> float:
+    return value if np.isnan(previous) else previous + alpha * (value - previous)
+
+
+def _Rsi(gains: np.ndarray, losses: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(losses == 0, 100., 100. - 100. / (1. + gains / losses))
+
+
+class Indicator:
+    """An indicator computed over the whole series at once and then candle by candle.
+
+    Compute returns the values of all candles and the state before the last
+    candle. Step computes the values of candle index from the state before it
+    and returns the state after it. The last candle is still open, its values
+    are recomputed from the same state until the next candle starts.
+    """
+    # Names of the values per candle
+    lines = ('value',)
+    # Values drawn as bars instead of lines
+    bars = ()
+    # Pane the indicator is drawn in, 'price' overlays the candles
+    pane = 'price'
+
+    def __init__(self, *params):
+        self.params = params
+
+    @property
+    def key(self) -> Tuple:
+        return (type(self).__name__,) + self.params
+
+    @property
+    def name(self) -> str:
+        return " ".join(str(part) for part in self.key)
+
+    def Compute(self, candles: Columns) -> Tuple[Tuple[np.ndarray, ...], Any]:
+        raise NotImplementedError
+
+    def Step(self, candles: Columns, index: int, state: Any) -> Tuple[Tuple[float, ...], Any]:
+        raise NotImplementedError
+
+    def Rising(self, candles: Columns, values: np.ndarray) -> np.ndarray:
+        """Which bars are drawn in the positive color"""
+        return values >= 0
+
+
+class SMA(Indicator):
+    """Simple moving average of the close, the state is the sum of the previous period closes"""
+
+    def __init__(self, period: int = 20):
+        super().__init__(int(period))
+        self.period = int(period)
+
+    def Compute(self, candles):
+        close = candles['close']
+        period = self.period
+        sums = np.cumsum(np.r_[0., close])
+        values = np.full(len(close), np.nan)
+        values[period - 1:] = (sums[period:] - sums[:-period]) / period
+        last = len(close) - 1
+        return (values,), close[max(last - period, 0):max(last, 0)].sum()
+
+    def Step(self, candles, index, state):
+        close = candles['close']
+        total = state + close[index] - (close[index - self.period] if index >= self.period else 0.)
+        return (total / self.period if index >= self.period - 1 else np.nan,), total
+
+
+class EMA(Indicator):
+    """Exponential moving average of the close, the state is the previous average"""
+
+    def __init__(self, period: int = 20):
+        super().__init__(int(period))
+        self.period = int(period)
+        self.alpha = 2. / (self.period + 1)
+
+    def Compute(self, candles):
+        average = _Ema(candles['close'], self.alpha)
+        values = average.copy()
+        values[:self.period - 1] = np.nan
+        return (values,), average[-2] if len(average) > 1 else np.nan
+
+    def Step(self, candles, index, state):
+        average = _EmaStep(state, candles['close'][index], self.alpha)
+        return (average if index >= self.period - 1 else np.nan,), average
+
+
+class RSI(Indicator):
+    """Relative strength index with the smoothing of Wilder.
+
+    The state is the previous average gain and loss.
+    """
+    pane = 'rsi'
+
+    def __init__(self, period: int = 14):
+        super().__init__(int(period))
+        self.period = int(period)
+
+    def Compute(self, candles):
+        delta = np.diff(candles['close'])
+        gains = _Ema(np.maximum(delta, 0.), 1. / self.period)
+        losses = _Ema(np.maximum(-delta, 0.), 1. / self.period)
+        values = np.r_[np.nan, _Rsi(gains, losses)] if len(delta) else np.full(len(candles), np.nan)
+        values[:self.period] = np.nan
+        state = (gains[-2], losses[-2]) if len(delta) > 1 else (np.nan, np.nan)
+        return (values,), state
+
+    def Step(self, candles, index, state):
+        if index == 0:
+            return (np.nan,), (np.nan, np.nan)
+        close = candles['close']
+        delta = close[index] - close[index - 1]
+        gain = _EmaStep(state[0], max(delta, 0.), 1. / self.period)
+        loss = _EmaStep(state[1], max(-delta, 0.), 1. / self.period)
+        value = float(_Rsi(np.array(gain), np.array(loss))) if index >= self.period else np.nan
+        return (value,), (gain, loss)
+
+
+class MACD(Indicator):
+    """Moving average convergence divergence, the state is the previous fast, slow and signal average"""
+    lines = ('macd', 'signal', 'histogram')
+    bars = ('histogram',)
+    pane = 'macd'
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        super().__init__(int(fast), int(slow), int(signal))
+        self.alphas = tuple(2. / (int(period) + 1) for period in (fast, slow, signal))
+        self.warmup = int(slow) - 1
+        self.signalWarmup = int(slow) + int(signal) - 2
+
+    def Compute(self, candles):
+        close = candles['close']
+        fast = _Ema(close, self.alphas[0])
+        slow = _Ema(close, self.alphas[1])
+        average = _Ema(fast - slow, self.alphas[2])
+        macd = fast - slow
+        histogram = macd - average
+        signal = average.copy()
+        macd[:self.warmup] = np.nan
+        signal[:self.signalWarmup] = np.nan
+        histogram[:self.signalWarmup] = np.nan
+        state = (fast[-2], slow[-2], average[-2]) if len(close) > 1 else (np.nan,) * 3
+        return (macd, signal, histogram), state
+
+    def Step(self, candles, index, state):
+        close = candles['close'][index]
+        fast = _EmaStep(state[0], close, self.alphas[0])
+        slow = _EmaStep(state[1], close, self.alphas[1])
+        signal = _EmaStep(state[2], fast - slow, self.alphas[2])
+        macd = fast - slow if index >= self.warmup else np.nan
+        if index < self.signalWarmup:
+            return (macd, np.nan, np.nan), (fast, slow, signal)
+        return (macd, signal, fast - slow - signal), (fast, slow, signal)
+
+
+class Bollinger(Indicator):
+    """Bollinger bands, a moving average with a band of deviations times the standard deviation.
+
+    Step only looks at the last period closes, so it doesn't need a state.
+    """
+    lines = ('middle', 'upper', 'lower')
+
+    def __init__(self, period: int = 20, deviations: float = 2.):
+        super().__init__(int(period), float(deviations))
+        self.period = int(period)
+        self.deviations = float(deviations)
+
+    def Compute(self, candles):
+        close = candles['close']
+        values = [np.full(len(close), np.nan) for _line in self.lines]
+        if len(close) >= self.period:
+            windows = np.lib.stride_tricks.sliding_window_view(close, self.period)
+            mean = windows.mean(axis=1)
+            band = self.deviations * windows.std(axis=1)
+            values[0][self.period - 1:] = mean
+            values[1][self.period - 1:] = mean + band
+            values[2][self.period - 1:] = mean - band
+        return tuple(values), None
+
+    def Step(self, candles, index, state):
+        if index < self.period - 1:
+            return (np.nan,) * 3, None
+        window = candles['close'][index - self.period + 1:index + 1]
+        mean = window.mean()
+        band = self.deviations * window.std()
+        return (mean, mean + band, mean - band), None
+
+
+class VWAP(Indicator):
+    """Volume weighted average price of the typical price, restarted every (UTC) day.
+
+    The state is the day with the sums of price times volume and volume so far.
+    """
+    DAY = 24 * 60 * 60
+
+    def __init__(self):
+        super().__init__()
+
+    def Compute(self, candles):
+        typical = (candles['high'] + candles['low'] + candles['close']) / 3.
+        volume = candles['volume']
+        if len(typical) == 0:
+            return (np.empty(0),), (None, 0., 0.)
+
+        day = candles['date'] // self.DAY
+        starts = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+        session = np.cumsum(np.r_[True, day[1:] != day[:-1]]) - 1
+        priceVolume = np.cumsum(typical * volume)
+        totalVolume = np.cumsum(volume)
+        priceVolume -= (priceVolume - typical * volume)[starts][session]
+        totalVolume -= (totalVolume - volume)[starts][session]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(totalVolume > 0, priceVolume / totalVolume, typical)
+
+        if len(typical) > 1:
+            state = (day[-2], priceVolume[-2], totalVolume[-2])
+        else:
+            state = (None, 0., 0.)
+        return (values,), state
+
+    def Step(self, candles, index, state):
+        day, priceVolume, totalVolume = state
+        typical = (candles['high'][index] + candles['low'][index] + candles['close'][index]) / 3.
+        volume = candles['volume'][index]
+        if candles['date'][index] // self.DAY != day:
+            priceVolume = totalVolume = 0.
+        priceVolume += typical * volume
+        totalVolume += volume
+        value = priceVolume / totalVolume if totalVolume > 0 else typical
+        return (value,), (candles['date'][index] // self.DAY, priceVolume, totalVolume)
+
+
+class Volume(Indicator):
+    """Traded volume per candle"""
+    lines = ('volume',)
+    bars = ('volume',)
+    pane = 'volume'
+
+    def __init__(self):
+        super().__init__()
+
+    def Compute(self, candles):
+        return (candles['volume'].copy(),), None
+
+    def Step(self, candles, index, state):
+        return (candles['volume'][index],), None
+
+    def Rising(self, candles, values):
+        return candles['close'] >= candles['open']
+
+
+_INDICATORS = {indicator.__name__.lower(): indicator
+               for indicator in (SMA, EMA, RSI, MACD, Bollinger, VWAP, Volume)}
+
+
+def ParseIndicator(text: str) -> Indicator:
+    """'Bollinger 20 2' -> Bollinger(20, 2.)"""
+    name, *params = text.split()
+    indicator = _INDICATORS.get(name.lower())
+    if indicator is None:
+        raise Exception(f"Unknown indicator: {text}")
+    return indicator(*(float(param) for param in params))
+
+
+class IndicatorSet:
+    """The indicators of one series of candles, kept up to date candle by candle"""
+    CANDLE = ('date', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, ohlcv: DataFrame):
+        # key -> [indicator, values, state before the last candle]
+        self.__indicators = dict()
+        self.Reset(ohlcv)
+
+    @staticmethod
+    def __Dates(ohlcv: DataFrame) -> np.ndarray:
+        return ohlcv.date.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+    def Reset(self, ohlcv: DataFrame) -> None:
+        """Replace the candles, all indicators are computed again"""
+        self.__candles = Columns(self.CANDLE, [self.__Dates(ohlcv)] +
+                                 [ohlcv[name].to_numpy(dtype=np.float64) for name in self.CANDLE[1:]])
+        for entry in self.__indicators.values():
+            self.__Compute(entry)
+
+    def __Compute(self, entry) -> None:
+        indicator = entry[0]
+        values, entry[2] = indicator.Compute(self.__candles)
+        entry[1] = Columns(indicator.lines, values)
+
+    @property
+    def dates(self) -> np.ndarray:
+        """Timestamps of the candles in seconds"""
+        return self.__candles['date']
+
+    @property
+    def candles(self) -> Columns:
+        return self.__candles
+
+    def Add(self, indicator: Indicator) -> None:
+        """Add the indicator, the values of an indicator with the same parameters are reused"""
+        if indicator.key not in self.__indicators:
+            entry = [indicator, None, None]
+            self.__Compute(entry)
+            self.__indicators[indicator.key] = entry
+
+    def Values(self, key: Tuple) -> Dict[str, np.ndarray]:
+        indicator, values, _state = self.__indicators[key]
+        return {line: values.Column(row) for row, line in enumerate(indicator.lines)}
+
+    def Update(self, candles: DataFrame) -> bool:
+        """Update the indicators with changed or new last candles.
+
+        :return: False when the candles don't continue the series, call Reset then.
+        """
+        dates = self.__Dates(candles)
+        series = self.__candles
+        if len(series) == 0 or dates[0] < series['date'][-1]:
+            return False
+
+        rows = np.column_stack([dates] + [candles[name].to_numpy(dtype=np.float64)
+                                          for name in self.CANDLE[1:]])
+        for row in rows:
+            last = len(series) - 1
+            if row[0] == series['date'][last]:
+                series.Set(last, row)
+            else:
+                # the last candle is closed, its state is final
+                for entry in self.__indicators.values():
+                    entry[2] = entry[0].Step(series, last, entry[2])[1]
+                series.Append(row)
+                for entry in self.__indicators.values():
+                    entry[1].Append([np.nan] * len(entry[0].lines))
+
+            last = len(series) - 1
+            for entry in self.__indicators.values():
+                entry[1].Set(last, entry[0].Step(series, last, entry[2])[0])
+        return True
+
+    def Extend(self, ohlcv: DataFrame) -> bool:
+        """Continue the series with newer candles of ohlcv.
+
+        :return: False when ohlcv doesn't start with the same candle, call Reset then.
+        """
+        if len(self.__candles) == 0 or len(ohlcv) == 0:
+            return False
+        dates = self.__Dates(ohlcv)
+        lastDate = self.__candles['date'][-1]
+        if dates[0] != self.__candles['date'][0] or dates[-1] < lastDate:
+            return False
+        return self.Update(ohlcv.iloc[int(np.searchsorted(dates, lastDate)):])
+
+
+class IndicatorCache:
+    """The indicator sets of the most recently used symbols and timeframes"""
+
+    def __init__(self, size: int = 16):
+        self.__size = size
+        self.__sets = OrderedDict()
+
+    def Get(self, exchange: str, symbol: str, timeframe: str, ohlcv: DataFrame) -> IndicatorSet:
+        """Indicator set of the candles, the cached values are reused when ohlcv continues them"""
+        key = (exchange, symbol, timeframe)
+        indicators = self.__sets.pop(key, None)
+        if indicators is None:
+            indicators = IndicatorSet(ohlcv)
+        elif not indicators.Extend(ohlcv):
+            indicators.Reset(ohlcv)
+        self.__sets[key] = indicators
+        while len(self.__sets) > self.__size:
+            self.__sets.popitem(last=False)
+        return indicators
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# Markets and prices of all configured exchanges.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Markets and prices of all configured exchanges
+"""
+
+__all__ = ["MarketIndex"]
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from symbolindex import SymbolIndex
+
+
+class MarketIndex(QObject):
+    """Searchable markets with their last price of every configured exchange.
+
+    The markets and tickers of an exchange are stored on disk and loaded in
+    the background again when they are older than TTL seconds, the exchanges
+    are loaded concurrently in the thread pool. marketsChanged is emitted
+    with the id of the exchange of which new markets are available.
+    """
+    marketsChanged = pyqtSignal(str)
+
+    TTL = 15 * 60
+    # Pool priority of the loading, below everything that is shown
+    PRIORITY = -3
+    TICKER_FIELDS = ('last', 'percentage')
+
+    def __init__(self, submit, directory: Optional[str] = None, parent=None):
+        """:param submit: DenarioTrader.Submit, runs the loading in the thread pool"""
+        super().__init__(parent)
+        if directory is None:
+            directory = os.path.expanduser("~/.local/share/denario/markets")
+        self.__submit = submit
+        self.__directory = directory
+        # exchId -> dict(time, markets, tickers)
+        self.__entries = dict()
+        self.__indexes = dict()
+        self.__loading = set()
+
+    def Refresh(self, exchIds: Iterable[str], active: Optional[str] = None) -> None:
+        """Load the markets of the exchanges of which no recent markets are known.
+
+        The markets of the active exchange are only read from disk, they are
+        Set when the exchange has been loaded.
+        """
+        active = active.lower() if active else None
+        for exchId in exchIds:
+            exchId = exchId.lower()
+            if exchId not in self.__entries:
+                entry = self.__Read(exchId)
+                if entry is not None:
+                    self.__SetEntry(exchId, entry)
+            entry = self.__entries.get(exchId)
+            if exchId != active and exchId not in self.__loading and \
+               (entry is None or time.time() - entry['time'] > self.TTL):
+                self.__loading.add(exchId)
+                self.__submit(self.__Fetch, exchId, self.__FileName(exchId), priority=self.PRIORITY,
+                              callback=lambda loaded, exchId=exchId: self.__OnFetched(exchId, loaded),
+                              errback=lambda _err, exchId=exchId: self.__loading.discard(exchId))
+
+    def Set(self, exchId: str, markets: Dict, tickers: Dict) -> None:
+        """Markets and tickers that have been loaded anyway (e.g. of the active exchange)"""
+        entry = self.__Compact(markets, tickers)
+        self.__SetEntry(exchId, entry)
+        self.__submit(self.__Write, self.__FileName(exchId), entry, priority=self.PRIORITY)
+
+    def Search(self, query: str) -> List[Tuple[str, str]]:
+        """(exchange id, symbol) of the markets of which the (upper case) query is part, sorted on symbol"""
+        found = sorted((symbol, exchId) for exchId, index in self.__indexes.items() for symbol in index.Search(query))
+        return [(exchId, symbol) for symbol, exchId in found]
+
+    def Ticker(self, exchId: str, symbol: str) -> Dict:
+        """Last known (possibly TTL old) ticker, an empty dict when it's unknown"""
+        entry = self.__entries.get(exchId)
+        return entry['tickers'].get(symbol, dict()) if entry is not None else dict()
+
+    def Market(self, exchId: str, symbol: str) -> Dict:
+        return self.__entries[exchId]['markets'][symbol]
+
+    def __SetEntry(self, exchId: str, entry: Dict) -> None:
+        self.__entries[exchId] = entry
+        self.__indexes[exchId] = SymbolIndex(entry['markets'])
+        self.marketsChanged.emit(exchId)
+
+    def __OnFetched(self, exchId: str, entry: Dict) -> None:
+        self.__loading.discard(exchId)
+        self.__SetEntry(exchId, entry)
+
+    def __FileName(self, exchId: str) -> str:
+        return os.path.join(self.__directory, f"{exchId}.json")
+
+    def __Read(self, exchId: str) -> Optional[Dict]:
+        try:
+            with open(self.__FileName(exchId), 'r') as fHandle:
+                return json.load(fHandle)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def __Compact(cls, markets: Dict, tickers: Dict) -> Dict:
+        """Only what the search shows, it's stored for every exchange"""
+        return dict(time=time.time(),
+                    markets={symbol: dict(id=market.get('id'),
+                                          base=market.get('base'),
+                                          quote=market.get('quote'),
+                                          active=market.get('active', True) is not False)
+                             for symbol, market in markets.items()},
+                    tickers={symbol: {field: ticker.get(field) for field in cls.TICKER_FIELDS}
+                             for symbol, ticker in tickers.items()})
+
+    @classmethod
+    def __Fetch(cls, exchId: str, fileName: str) -> Dict:
+        """Runs in the thread pool"""
+        import ccxt
+        exchange = getattr(ccxt, exchId)({'timeout': 30000, 'enableRateLimit': True})
+        markets = exchange.load_markets()
+        tickers = exchange.fetchTickers() if exchange.has['fetchTickers'] else dict()
+        entry = cls.__Compact(markets, tickers)
+        cls.__Write(fileName, entry)
+        return entry
+
+    @staticmethod
+    def __Write(fileName: str, entry: Dict) -> None:
+        """Runs in the thread pool"""
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+        # the active exchange can be written by two threads at once
+        tmpName = f"{fileName}.{threading.get_ident()}.tmp"
+        with open(tmpName, 'w') as fHandle:
+            json.dump(entry, fHandle)
+        os.replace(tmpName, fileName)
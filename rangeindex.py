@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Constant time minimum/maximum queries over ranges of an array.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Constant time minimum/maximum queries over ranges of an array
+"""
+
+__all__ = ["RangeExtrema"]
+
+from typing import Optional
+
+import numpy as np
+
+
+class RangeExtrema:
+    """Sparse table over blocks of an array for range minimum or maximum queries.
+
+    The values are reduced per BLOCK elements, the sparse table is built over
+    those blocks. A query combines two table entries with the (at most two)
+    partial blocks at the ends, so it costs the same for any array length,
+    while the table only takes n / BLOCK * log(n / BLOCK) memory.
+    """
+    BLOCK = 32
+
+    def __init__(self, values: np.ndarray, ufunc=np.minimum):
+        """:param ufunc: np.minimum or np.maximum"""
+        self.__values = values
+        self.__ufunc = ufunc
+
+        starts = np.arange(0, len(values), self.BLOCK)
+        table = [ufunc.reduceat(values, starts) if len(values) else np.empty(0, dtype=values.dtype)]
+        half = 1
+        while 2 * half <= len(table[0]):
+            previous = table[-1]
+            table.append(ufunc(previous[:-half], previous[half:]))
+            half *= 2
+        self.__table = table
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the table in bytes"""
+        return sum(row.nbytes for row in self.__table)
+
+    def Query(self, first: int, last: int) -> Optional[float]:
+        """Minimum or maximum of values[first:last], None for an empty range"""
+        first = max(int(first), 0)
+        last = min(int(last), len(self.__values))
+        if first >= last:
+            return None
+
+        reduce = self.__ufunc.reduce
+        firstBlock = -(-first // self.BLOCK)
+        lastBlock = last // self.BLOCK
+        if firstBlock >= lastBlock:
+            return reduce(self.__values[first:last])
+
+        level = (lastBlock - firstBlock).bit_length() - 1
+        row = self.__table[level]
+        result = self.__ufunc(row[firstBlock], row[lastBlock - (1 << level)])
+        if first < firstBlock * self.BLOCK:
+            result = self.__ufunc(result, reduce(self.__values[first:firstBlock * self.BLOCK]))
+        if lastBlock * self.BLOCK < last:
+            result = self.__ufunc(result, reduce(self.__values[lastBlock * self.BLOCK:last]))
+        return result
+
+    def Update(self, index: int) -> None:
+        """values[index] changed in place, only cheap for the last elements"""
+        block = int(index) // self.BLOCK
+        self.__table[0][block] = self.__ufunc.reduce(self.__values[block * self.BLOCK:(block + 1) * self.BLOCK])
+        for level in range(1, len(self.__table)):
+            half = 1 << (level - 1)
+            previous = self.__table[level - 1]
+            row = self.__table[level]
+            for entry in range(max(0, block - 2 * half + 1), min(block, len(row) - 1) + 1):
+                row[entry] = self.__ufunc(previous[entry], previous[entry + half])
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Symbols kept sorted on a value that changes with the tickers.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Symbols kept sorted on a value that changes with the tickers
+"""
+
+__all__ = ["Ranking"]
+
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, List, Tuple
+
+
+class Ranking:
+    """Symbols in ascending order of key(symbol).
+
+    The key of every symbol is remembered, a changed symbol is found with
+    bisect on its old key and moved to the place of its new key, so an
+    update costs O(log n) compares and one list shift instead of a sort.
+    """
+
+    def __init__(self, key: Callable[[str], Any], symbols: Iterable[str] = ()):
+        self.key = key
+        self.Reset(symbols)
+
+    def Reset(self, symbols: Iterable[str]) -> None:
+        """Sort the symbols again"""
+        keys = sorted((self.key(symbol), symbol) for symbol in symbols)
+        self.__keys = [key for key, _symbol in keys]
+        self.__symbols = [symbol for _key, symbol in keys]
+        self.__keyOf = {symbol: key for key, symbol in keys}
+
+    def __len__(self) -> int:
+        return len(self.__symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.__keyOf
+
+    def __getitem__(self, position):
+        return self.__symbols[position]
+
+    def __iter__(self):
+        return iter(self.__symbols)
+
+    def Position(self, symbol: str) -> int:
+        return bisect_left(self.__keys, self.__keyOf[symbol])
+
+    def Changed(self, symbol: str) -> bool:
+        """True when the key of the symbol differs from the key it's sorted on"""
+        return self.key(symbol) != self.__keyOf[symbol]
+
+    def Place(self, symbol: str) -> int:
+        """Position the symbol gets with its current key (on Insert or Update)"""
+        position = bisect_left(self.__keys, self.key(symbol))
+        if symbol in self.__keyOf and position > self.Position(symbol):
+            # it's no longer in front of itself
+            position -= 1
+        return position
+
+    def Insert(self, symbol: str) -> int:
+        """Add the symbol, returns its position"""
+        key = self.key(symbol)
+        position = bisect_left(self.__keys, key)
+        self.__keys.insert(position, key)
+        self.__symbols.insert(position, symbol)
+        self.__keyOf[symbol] = key
+        return position
+
+    def Remove(self, symbol: str) -> int:
+        """Remove the symbol, returns the position it had"""
+        position = self.Position(symbol)
+        del self.__keys[position]
+        del self.__symbols[position]
+        del self.__keyOf[symbol]
+        return position
+
+    def Update(self, symbol: str) -> Tuple[int, int]:
+        """Move the symbol to the place of its new key, returns the old and new position"""
+        return self.Remove(symbol), self.Insert(symbol)
+
+    def Top(self, count: int, descending: bool = True,
+            valid: Callable[[str], bool] = lambda _symbol: True) -> List[str]:
+        """The first count valid symbols from the top (descending) or the bottom"""
+        symbols = reversed(self.__symbols) if descending else iter(self.__symbols)
+        top = list()
+        for symbol in symbols:
+            if len(top) == count:
+                break
+            if valid(symbol):
+                top.append(symbol)
+        return top
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# Spread requests to the exchange over time.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Spread requests to the exchange over time
+"""
+
+__all__ = ["RateLimiter"]
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread safe limiter that hands out one request slot per interval.
+
+    ccxt throttles the requests of a single thread, concurrent requests from
+    the thread pool need to share their budget through this limiter.
+    """
+    def __init__(self, interval: float):
+        """:param interval: minimum time between two requests in ms"""
+        self.__interval = interval / 1000.
+        self.__lock = threading.Lock()
+        self.__next = 0.
+
+    def Wait(self) -> None:
+        """Block until the next free slot"""
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next)
+            self.__next = slot + self.__interval
+        if slot > now:
+            time.sleep(slot - now)
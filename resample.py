@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# Derive candles of a larger timeframe from the candles of a smaller one.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Derive candles of a larger timeframe from the candles of a smaller one
+"""
+
+__all__ = ["ParseTimeframe", "CanResample", "BucketStart", "ShiftBuckets", "CountBuckets", "Resample"]
+
+from typing import Tuple
+
+import numpy as np
+
+MINUTE = 60 * 1000
+DAY = 24 * 60 * MINUTE
+# 1970-01-01 was a thursday, weeks start on monday (like the exchanges)
+MONDAY = 4 * DAY
+
+_UNITS = {'s': 1000, 'm': MINUTE, 'h': 60 * MINUTE, 'd': DAY, 'w': 7 * DAY}
+
+
+def ParseTimeframe(timeframe: str) -> Tuple[int, str]:
+    """'15m' -> (15, 'm'), the units are s, m, h, d, w and M (month)"""
+    amount, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit not in _UNITS and unit != 'M':
+        raise Exception(f"Unknown timeframe: {timeframe}")
+    return amount, unit
+
+
+def _Duration(timeframe: str) -> int:
+    """Duration in ms of a timeframe with a fixed length"""
+    amount, unit = ParseTimeframe(timeframe)
+    return amount * _UNITS[unit]
+
+
+def CanResample(source: str, target: str) -> bool:
+    """True when every target candle consists of whole source candles.
+
+    False for timeframes that can't be parsed (e.g. '1y' or '15' of some exchanges).
+    """
+    try:
+        sourceAmount, sourceUnit = ParseTimeframe(source)
+        targetAmount, targetUnit = ParseTimeframe(target)
+    except Exception:
+        return False
+    if sourceUnit == targetUnit and sourceUnit in ('M', 'w'):
+        return targetAmount > sourceAmount and targetAmount % sourceAmount == 0
+    if sourceUnit == 'M':
+        return False
+
+    sourceDuration = _Duration(source)
+    if targetUnit in ('M', 'w'):
+        # months and weeks start at midnight
+        return DAY % sourceDuration == 0
+    targetDuration = _Duration(target)
+    return targetDuration > sourceDuration and targetDuration % sourceDuration == 0
+
+
+def BucketStart(timestamps: np.ndarray, timeframe: str) -> np.ndarray:
+    """Start in ms of the candle of timeframe that holds each timestamp (in ms)"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    amount, unit = ParseTimeframe(timeframe)
+    if unit == 'M':
+        months = timestamps.astype('datetime64[ms]').astype('datetime64[M]').astype(np.int64)
+        months -= months % amount
+        return months.astype('datetime64[M]').astype('datetime64[ms]').astype(np.int64)
+    duration = _Duration(timeframe)
+    if unit == 'w':
+        return (timestamps - MONDAY) // duration * duration + MONDAY
+    return timestamps // duration * duration
+
+
+def ShiftBuckets(start: int, timeframe: str, count: int) -> int:
+    """Start in ms of the candle count candles of timeframe after the candle at start"""
+    amount, unit = ParseTimeframe(timeframe)
+    if unit == 'M':
+        month = np.datetime64(int(start), 'ms').astype('datetime64[M]') + count * amount
+        return int(month.astype('datetime64[ms]').astype(np.int64))
+    return int(start) + count * _Duration(timeframe)
+
+
+def CountBuckets(start: int, end: int, timeframe: str) -> int:
+    """Number of candles of timeframe from the candle at start up to the candle at end"""
+    amount, unit = ParseTimeframe(timeframe)
+    if unit == 'M':
+        months = np.array([start, end], dtype='datetime64[ms]').astype('datetime64[M]').astype(np.int64)
+        return int(months[1] - months[0]) // amount
+    return (int(end) - int(start)) // _Duration(timeframe)
+
+
+def Resample(ohlcv: np.ndarray, timeframe: str) -> np.ndarray:
+    """Aggregate the ohlcv rows (date in ms, open, high, low, close, volume) in candles of timeframe.
+
+    The rows must be sorted on date. The first and last candle can be
+    incomplete when the rows don't start or end on a candle boundary.
+    """
+    ohlcv = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+    if len(ohlcv) == 0:
+        return ohlcv
+
+    starts = BucketStart(ohlcv[:, 0], timeframe)
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+    last = np.r_[first[1:], len(ohlcv)] - 1
+    return np.column_stack((starts[first],
+                            ohlcv[first, 1],
+                            np.maximum.reduceat(ohlcv[:, 2], first),
+                            np.minimum.reduceat(ohlcv[:, 3], first),
+                            ohlcv[last, 4],
+                            np.add.reduceat(ohlcv[:, 5], first)))
@@ -22,68 +22,302 @@ Module for selecting symbols
 import os
 
 from PyQt5.uic import loadUi
-from PyQt5.QtWidgets import QWidget
+from PyQt5.QtWidgets import QAbstractItemView, QMenu, QTableView, QWidget
 from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSlot, pyqtSignal
 from PyQt5.QtGui import QColor
 
-from denariotrader import DenarioTrader, Exchange
+from denariotrader import DenarioTrader
 from config import Config
+from symbolindex import SymbolIndex
+from ranking import Ranking
 
 
 class TreeSymbolModel(QAbstractTableModel):
+    """Scanner of the tickers of the markets that match the search, sorted on a column.
+
+    The sorted order is kept up to date per changed ticker: a symbol that
+    changes place is moved with beginMoveRows, only when many symbols change
+    at once the rows are sorted again with a layout change. The shown symbols
+    are sorted ascending, descending order reverses the rows.
+
+    Besides the shown rows all markets are ranked on the volume, the change
+    and the absolute change, which answers the Top lists without sorting.
+    """
     symbolsChanged = pyqtSignal()
+    COLUMNS = ("Market", "Price", "Volume", "Change", "Spread", "Volatility")
+    # More changed symbols than this are sorted again instead of moved one by one
+    MOVE_LIMIT = 32
+    # top list -> (ranking, column of the value, descending)
+    TOPS = {"Volume": ('volume', 2, True),
+            "Gainers": ('change', 3, True),
+            "Losers": ('change', 3, False),
+            "Movers": ('movers', 3, True)}
+    TOP_COUNT = 50
+
     def __init__(self, exchange):
         super().__init__()
 
-        self.__rowCount = None
-        self.__columnCount = 2
+        self.__columnCount = len(self.COLUMNS)
         self.__exchange = exchange
         self.__trader = DenarioTrader.GetInstance()
         self.__trader.exchangeChanged.connect(self.OnChangedExchange)
         self.__search = ""
         self.__sorting = (0, Qt.AscendingOrder)
+        self.__favoritesOnly = False
+        # the shown top list, None shows all markets
+        self.__top = None
+        self.__topSymbols = frozenset()
+        self.__index = SymbolIndex(exchange.markets if exchange is not None else dict())
+        # the shown symbols
+        self.__shown = Ranking(lambda symbol: self.__Key(symbol, self.__sorting[0]))
+        # all symbols ranked on the value of a top list
+        self.__rankings = {'volume': Ranking(lambda symbol: self.__Key(symbol, 2)),
+                           'change': Ranking(lambda symbol: self.__Key(symbol, 3)),
+                           'movers': Ranking(self.__MoverKey)}
 
         config = Config()['pallet']
         self.__oddColor = config['rowOdd']
         self.__evenColor = config['rowEven']
+        self.__ResetRankings()
         self.OnSearchChanged("")
-        self.__trader.timer.timeout.connect(self.OnTimer)
+        self.__trader.tickers.tickersChanged.connect(self.OnTickersChanged)
+
+    def __Matches(self, symbol: str) -> bool:
+        return symbol in self.__trader.tickers and self.__index.Matches(symbol, self.__search) and \
+               (not self.__favoritesOnly or symbol in self.favorites) and \
+               (self.__top is None or symbol in self.__topSymbols)
+
+    @property
+    def favorites(self) -> list:
+        """The favorite symbols of the exchange, stored in the configuration"""
+        exchId = self.__exchange.id if self.__exchange is not None else ""
+        return Config()['denario'].setdefault('favorites', dict()).setdefault(exchId, list())
+
+    def ShowFavorites(self, favoritesOnly: bool) -> None:
+        """Only show the favorites, then only their tickers are refreshed"""
+        self.__favoritesOnly = favoritesOnly
+        self.__trader.FocusTickers(self.favorites if favoritesOnly else None)
+        self.OnSearchChanged(self.__search)
+
+    def ShowTop(self, top: str = None) -> None:
+        """Only show the TOP_COUNT markets of the top list (a key of TOPS), None shows all"""
+        self.__top = top
+        self.OnSearchChanged(self.__search)
+
+    def ToggleFavorite(self, symbol: str) -> None:
+        favorites = self.favorites
+        if symbol in favorites:
+            favorites.remove(symbol)
+        else:
+            favorites.append(symbol)
+        Config.Save()
+        if self.__favoritesOnly:
+            self.__trader.FocusTickers(favorites)
+            self.OnSearchChanged(self.__search)
+        else:
+            self.__EmitChanged([symbol], first=0)
+
+    def Value(self, symbol: str, column: int):
+        """Value of the ticker of the symbol in the column, None when it's unknown"""
+        ticker = self.__trader.tickers[symbol]
+        if column == 1:
+            return ticker.get('close')
+        elif column == 2:
+            volume = ticker.get('quoteVolume')
+            if volume is None and ticker.get('baseVolume') is not None and ticker.get('last') is not None:
+                volume = ticker['baseVolume'] * ticker['last']
+            return volume
+        elif column == 3:
+            return ticker.get('percentage')
+        elif column == 4:
+            bid, ask = ticker.get('bid'), ticker.get('ask')
+            if not bid or not ask:
+                return None
+            return (ask - bid) / (ask + bid) * 200.
+        elif column == 5:
+            high, low = ticker.get('high'), ticker.get('low')
+            if high is None or not low:
+                return None
+            return (high - low) / low * 100.
+        return symbol
+
+    def __Key(self, symbol: str, column: int):
+        if column == 0:
+            return symbol
+        value = self.Value(symbol, column)
+        # unknown values rank lowest
+        return (value is not None, value or 0., symbol)
+
+    def __MoverKey(self, symbol: str):
+        value = self.Value(symbol, 3)
+        return (value is not None, abs(value or 0.), symbol)
+
+    def Top(self, top: str, count: int):
+        """The count markets at the top of the top list, e.g. Top("Volume", 50)"""
+        ranking, column, descending = self.TOPS[top]
+        return self.__rankings[ranking].Top(count, descending,
+                                            lambda symbol: self.Value(symbol, column) is not None)
+
+    def __ResetRankings(self) -> None:
+        tickers = self.__trader.tickers
+        symbols = [symbol for symbol in tickers if symbol in self.__index]
+        for ranking in self.__rankings.values():
+            ranking.Reset(symbols)
+
+    def __UpdateRankings(self, symbols) -> None:
+        tickers = self.__trader.tickers
+        for ranking in self.__rankings.values():
+            for symbol in symbols:
+                listed = symbol in tickers and symbol in self.__index
+                if symbol in ranking:
+                    if not listed:
+                        ranking.Remove(symbol)
+                    elif ranking.Changed(symbol):
+                        ranking.Update(symbol)
+                elif listed:
+                    ranking.Insert(symbol)
+
+    def __Row(self, position: int, length: int = None) -> int:
+        """Row of the position in the ascending order"""
+        if self.__sorting[1] == Qt.AscendingOrder:
+            return position
+        return (len(self.__shown) if length is None else length) - 1 - position
+
+    def Symbol(self, row: int) -> str:
+        """Symbol shown in row"""
+        return self.__shown[self.__Row(row)]
+
+    @property
+    def symbols(self):
+        """The shown symbols in the order of the rows"""
+        if self.__sorting[1] == Qt.AscendingOrder:
+            return list(self.__shown)
+        return list(self.__shown)[::-1]
 
     @pyqtSlot(str)
     def OnSearchChanged(self, search: str):
+        self.beginResetModel()
         self.__search = search.upper()
-        self.tickers = list()
-        for symbol, ticker in self.__trader.tickers.items():
-            if self.__search in symbol and self.__exchange.markets[symbol]['active']:
-                self.tickers.append(ticker)
-
-        if self.__sorting[0] == 0:
-            func = lambda ticker: ticker['symbol']
-        elif self.__sorting[0] == 1:
-            func = lambda ticker: ticker['close']
-
-        self.tickers = sorted(self.tickers, key=func, reverse=self.__sorting[1] != Qt.AscendingOrder)
-        self.__rowCount = len(self.tickers)
+        tickers = self.__trader.tickers
+        favorites = set(self.favorites) if self.__favoritesOnly else None
+        self.__topSymbols = frozenset(self.Top(self.__top, self.TOP_COUNT)) if self.__top is not None else frozenset()
+        self.__shown.Reset(symbol for symbol in self.__index.Search(self.__search)
+                           if symbol in tickers and (favorites is None or symbol in favorites) and
+                           (self.__top is None or symbol in self.__topSymbols))
+        self.endResetModel()
         self.symbolsChanged.emit()
 
-    @pyqtSlot(Exchange)
+    @pyqtSlot(object)
     def OnChangedExchange(self, exchange):
         self.__exchange = exchange
+        self.__index = SymbolIndex(exchange.markets if exchange is not None else dict())
+        self.__ResetRankings()
+        if self.__favoritesOnly:
+            self.__trader.FocusTickers(self.favorites)
         self.OnSearchChanged(self.__search)
 
-    @pyqtSlot()
-    def OnTimer(self):
-        self.OnSearchChanged(self.__search)
+    @pyqtSlot(set)
+    def OnTickersChanged(self, symbols: set):
+        """Only update, insert, remove or move the rows of the changed symbols"""
+        self.__UpdateRankings(symbols)
+        if self.__top is not None:
+            # the symbols that entered or left the top list are inserted or removed
+            top = frozenset(self.Top(self.__top, self.TOP_COUNT))
+            symbols = set(symbols) | (top ^ self.__topSymbols)
+            self.__topSymbols = top
+        shown = self.__shown
+        visible = [symbol for symbol in symbols if symbol in shown]
+        removed = [symbol for symbol in visible if not self.__Matches(symbol)]
+        added = [symbol for symbol in symbols if symbol not in shown and self.__Matches(symbol)]
+        if len(removed) + len(added) > self.MOVE_LIMIT:
+            # e.g. the tickers of another exchange
+            self.__ResetRankings()
+            self.OnSearchChanged(self.__search)
+            return
+
+        for symbol in removed:
+            row = self.__Row(shown.Position(symbol))
+            self.beginRemoveRows(QModelIndex(), row, row)
+            shown.Remove(symbol)
+            self.endRemoveRows()
+
+        visible = [symbol for symbol in visible if symbol in shown]
+        if len(visible) > self.MOVE_LIMIT and self.__sorting[0] != 0:
+            self.__Resort()
+            self.__EmitChanged(visible)
+        else:
+            changed = list()
+            for symbol in visible:
+                if shown.Changed(symbol):
+                    self.__Move(symbol)
+                else:
+                    changed.append(symbol)
+            self.__EmitChanged(changed)
+
+        for symbol in added:
+            row = self.__Row(shown.Place(symbol), len(shown) + 1)
+            self.beginInsertRows(QModelIndex(), row, row)
+            shown.Insert(symbol)
+            self.endInsertRows()
+
+    def __EmitChanged(self, symbols, first: int = 1) -> None:
+        rows = [self.__Row(self.__shown.Position(symbol)) for symbol in symbols if symbol in self.__shown]
+        if len(rows) > self.MOVE_LIMIT:
+            # a single range instead of a signal per row
+            self.dataChanged.emit(self.index(min(rows), first), self.index(max(rows), self.__columnCount - 1))
+            return
+        for row in rows:
+            self.dataChanged.emit(self.index(row, first), self.index(row, self.__columnCount - 1))
+
+    def __Move(self, symbol: str) -> None:
+        """Move the row of the symbol to the place of its new key"""
+        shown = self.__shown
+        row = self.__Row(shown.Position(symbol))
+        newRow = self.__Row(shown.Place(symbol))
+        # the destination is the row before which it's moved in the current rows
+        moved = newRow != row and self.beginMoveRows(QModelIndex(), row, row, QModelIndex(),
+                                                     newRow + 1 if newRow > row else newRow)
+        shown.Update(symbol)
+        if moved:
+            self.endMoveRows()
+        self.dataChanged.emit(self.index(newRow, 1), self.index(newRow, self.__columnCount - 1))
+
+    def __Resort(self, sorting: tuple = None) -> None:
+        """Sort the shown symbols again, the persistent indexes (selection) follow their symbols.
+
+        sorting is the new (column, order), the rows of the persistent indexes
+        are still in the current order.
+        """
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        symbols = [self.Symbol(index.row()) for index in persistent]
+        if sorting is not None:
+            self.__sorting = sorting
+        self.__shown.Reset(list(self.__shown))
+        self.changePersistentIndexList(persistent, [self.index(self.__Row(self.__shown.Position(symbol)),
+                                                               index.column())
+                                                    for symbol, index in zip(symbols, persistent)])
+        self.layoutChanged.emit()
 
     def rowCount(self, parent: QModelIndex=QModelIndex()):
-        return self.__rowCount
+        return len(self.__shown) if not parent.isValid() else 0
 
     def columnCount(self, parent: QModelIndex=QModelIndex()):
-        return self.__columnCount
+        return self.__columnCount if not parent.isValid() else 0
 
     def sort(self, column, order=Qt.AscendingOrder):
-        self.__sorting = (column, order)
-        self.OnSearchChanged(self.__search)
+        if (column, order) == self.__sorting:
+            return
+        if column == self.__sorting[0]:
+            # only the direction changes, the rows are reversed
+            self.layoutAboutToBeChanged.emit()
+            persistent = self.persistentIndexList()
+            self.__sorting = (column, order)
+            self.changePersistentIndexList(persistent, [self.index(len(self.__shown) - 1 - index.row(),
+                                                                   index.column()) for index in persistent])
+            self.layoutChanged.emit()
+        else:
+            self.__Resort((column, order))
 
 
     def headerData(self,
@@ -93,7 +327,7 @@ class TreeSymbolModel(QAbstractTableModel):
         if role != Qt.DisplayRole:
             return None
         if orientation == Qt.Horizontal:
-            return ("Market", "Price")[section]
+            return self.COLUMNS[section]
         else:
             return "{}".format(section)
 
@@ -102,14 +336,22 @@ class TreeSymbolModel(QAbstractTableModel):
         row = index.row()
 
         if role == Qt.DisplayRole:
-            ticker = self.tickers[row]
-            symbol = ticker['symbol']
+            symbol = self.Symbol(row)
             if column == 0:
-                return symbol
+                return f"\u2605 {symbol}" if symbol in self.favorites else symbol
+            value = self.Value(symbol, column)
+            if value is None:
+                return ""
             elif column == 1:
-                close = ticker['close']
                 precision = self.__exchange.markets[symbol]['precision']['price']
-                return f"{close:.{precision}f}"
+                return f"{value:.{precision}f}"
+            elif column == 2:
+                for unit, size in (("B", 1e9), ("M", 1e6), ("K", 1e3)):
+                    if value >= size:
+                        return f"{value / size:.2f}{unit}"
+                return f"{value:.2f}"
+            else:
+                return f"{value:.2f}%"
         elif role == Qt.BackgroundRole:
             if index.row() & 1:
                 return self.__oddColor
@@ -123,6 +365,76 @@ class TreeSymbolModel(QAbstractTableModel):
 
         return None
 
+class MarketSearchModel(QAbstractTableModel):
+    """The markets of all configured exchanges that match the search"""
+    COLUMNS = ("Exchange", "Market", "Price", "Change")
+
+    def __init__(self):
+        super().__init__()
+        self.__trader = DenarioTrader.GetInstance()
+        self.__trader.markets.marketsChanged.connect(self.OnMarketsChanged)
+        self.__search = ""
+        # (exchange id, symbol)
+        self.markets = list()
+
+        config = Config()['pallet']
+        self.__oddColor = config['rowOdd']
+        self.__evenColor = config['rowEven']
+
+    @pyqtSlot(str)
+    def OnSearchChanged(self, search: str):
+        self.beginResetModel()
+        self.__search = search.upper()
+        self.markets = self.__trader.markets.Search(self.__search) if self.__search else list()
+        self.endResetModel()
+
+    @pyqtSlot(str)
+    def OnMarketsChanged(self, exchId: str):
+        self.OnSearchChanged(self.__search)
+
+    def rowCount(self, parent: QModelIndex=QModelIndex()):
+        return len(self.markets) if not parent.isValid() else 0
+
+    def columnCount(self, parent: QModelIndex=QModelIndex()):
+        return len(self.COLUMNS) if not parent.isValid() else 0
+
+    def headerData(self,
+                   section: int,
+                   orientation: Qt.Orientation,
+                   role: Qt.ItemDataRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        return self.COLUMNS[section]
+
+    def data(self, index: QModelIndex, role: Qt.ItemDataRole=Qt.DisplayRole):
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            exchId, symbol = self.markets[index.row()]
+            if column == 0:
+                exchange = self.__trader.exchanges.get(exchId)
+                return exchange['name'] if exchange is not None else exchId
+            elif column == 1:
+                return symbol
+
+            active = self.__trader.exchange
+            if active is not None and active.id == exchId:
+                # the tickers of the active exchange are up to date
+                ticker = self.__trader.tickers.get(symbol, dict())
+            else:
+                ticker = self.__trader.markets.Ticker(exchId, symbol)
+            value = ticker.get('last') if column == 2 else ticker.get('percentage')
+            if value is None:
+                return ""
+            return f"{value}" if column == 2 else f"{value:.2f}%"
+        elif role == Qt.BackgroundRole:
+            return self.__oddColor if index.row() & 1 else self.__evenColor
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignLeft if column < 2 else Qt.AlignRight
+
+        return None
+
+
 class SelectSymbol(QWidget):
     symbolSelected = pyqtSignal(str)
     def __init__(self, parent=None):
@@ -136,18 +448,72 @@ class SelectSymbol(QWidget):
         self.__symbolModel.symbolsChanged.connect(self.tableSymbols.update)
         self.tableSymbols.setSortingEnabled(True);
         self.tableSymbols.sortByColumn(0, Qt.AscendingOrder)
+        self.tableSymbols.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tableSymbols.customContextMenuRequested.connect(self.__OnContextMenu)
+        self.cmbTop.addItem("All markets", None)
+        for top in TreeSymbolModel.TOPS:
+            self.cmbTop.addItem(f"Top {TreeSymbolModel.TOP_COUNT} {top.lower()}", top)
+        self.cmbTop.currentIndexChanged.connect(self.OnTopChanged)
+
+        # the search results of all configured exchanges, only while searching
+        trader = DenarioTrader.GetInstance()
+        self.__marketModel = MarketSearchModel()
+        self.tableMarkets = QTableView(self)
+        self.tableMarkets.setModel(self.__marketModel)
+        self.tableMarkets.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tableMarkets.setCornerButtonEnabled(False)
+        self.tableMarkets.verticalHeader().setVisible(False)
+        self.tableMarkets.setVisible(False)
+        self.tableMarkets.doubleClicked.connect(self.OnMarketSelected)
+        self.verticalLayout_2.addWidget(self.tableMarkets)
+        self.editSearch.textChanged.connect(self.__OnSearchChanged)
+        self.editSearch.textChanged.connect(self.__marketModel.OnSearchChanged)
+        trader.RefreshMarkets()
+
+    def __OnSearchChanged(self, search: str):
+        if search and self.tableMarkets.isHidden():
+            # a search starts, the markets that are older than the TTL are loaded again
+            DenarioTrader.GetInstance().RefreshMarkets()
+        self.tableMarkets.setVisible(bool(search))
 
     def OnShowAll(self):
-        print("Show All")
         self.btnAll.setEnabled(False)
         self.btnFavorites.setEnabled(True)
+        self.btnFavorites.setChecked(False)
+        self.__symbolModel.ShowFavorites(False)
 
     def OnShowFavorites(self):
-        print("Show favorites")
         self.btnAll.setEnabled(True)
+        self.btnAll.setChecked(False)
         self.btnFavorites.setEnabled(False)
+        self.__symbolModel.ShowFavorites(True)
+
+    def OnTopChanged(self, index: int):
+        top = self.cmbTop.itemData(index)
+        self.__symbolModel.ShowTop(top)
+        if top is not None:
+            _ranking, column, descending = TreeSymbolModel.TOPS[top]
+            self.tableSymbols.sortByColumn(column, Qt.DescendingOrder if descending else Qt.AscendingOrder)
+
+    def __OnContextMenu(self, position):
+        index = self.tableSymbols.indexAt(position)
+        if not index.isValid():
+            return
+        symbol = self.__symbolModel.Symbol(index.row())
+        menu = QMenu(self)
+        text = "Remove from favorites" if symbol in self.__symbolModel.favorites else "Add to favorites"
+        menu.addAction(text, lambda: self.__symbolModel.ToggleFavorite(symbol))
+        menu.exec_(self.tableSymbols.viewport().mapToGlobal(position))
+
+    @pyqtSlot(QModelIndex)
+    def OnMarketSelected(self, index: QModelIndex):
+        """Markets of the active exchange can be shown, the others only list their price"""
+        exchId, symbol = self.__marketModel.markets[index.row()]
+        exchange = DenarioTrader.GetInstance().exchange
+        if exchange is not None and exchange.id == exchId:
+            self.symbolSelected.emit(symbol)
 
     @pyqtSlot(QModelIndex)
     def OnSymbolSelected(self, index: QModelIndex):
-        symbol = self.__symbolModel.tickers[index.row()]['symbol']
+        symbol = self.__symbolModel.Symbol(index.row())
         self.symbolSelected.emit(symbol)
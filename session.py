@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+#
+# Snapshot of the last session, shown at the start until fresh data arrives.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Snapshot of the last session, shown at the start until fresh data arrives
+"""
+
+__all__ = ["SessionSnapshot"]
+
+import os
+import pickle
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+
+class SessionSnapshot:
+    """Markets, tickers and candles of the active exchange of the last session.
+
+    Stored as a zlib compressed pickle. The file is replaced by a completely
+    written temporary file, a snapshot that can't be read (e.g. of another
+    VERSION) is ignored.
+    """
+    VERSION = 1
+
+    def __init__(self, exchId: str, markets: Dict, tickers: Dict,
+                 candles: Dict[Tuple[str, str], List[List]], created: Optional[float] = None):
+        """:param candles: (symbol, timeframe) -> raw ccxt ohlcv"""
+        self.exchId = exchId
+        self.markets = markets
+        self.tickers = tickers
+        self.candles = candles
+        self.created = created if created is not None else time.time()
+
+    @staticmethod
+    def DefaultFileName() -> str:
+        return os.path.expanduser("~/.local/share/denario/session.bin")
+
+    @classmethod
+    def Load(cls, fileName: str) -> Optional["SessionSnapshot"]:
+        try:
+            with open(fileName, 'rb') as fHandle:
+                state = pickle.loads(zlib.decompress(fHandle.read()))
+            if state.pop('version', None) != cls.VERSION:
+                return None
+            return cls(**state)
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError, TypeError, ValueError, AttributeError):
+            return None
+
+    def Save(self, fileName: str) -> None:
+        """Can run in the thread pool"""
+        state = dict(version=self.VERSION, exchId=self.exchId, markets=self.markets, tickers=self.tickers,
+                     candles=self.candles, created=self.created)
+        data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        os.makedirs(os.path.dirname(os.path.abspath(fileName)), exist_ok=True)
+        # the periodic and the final snapshot can be written at the same time
+        tmpName = f"{fileName}.{threading.get_ident()}.tmp"
+        with open(tmpName, 'wb') as fHandle:
+            fHandle.write(data)
+        os.replace(tmpName, fileName)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# Timing of the phases of the start of the application.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Timing of the phases of the start of the application
+"""
+
+__all__ = ["StartupProfile"]
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupProfile:
+    """Start and end of the phases of the start, printed with --profile-startup.
+
+    The times are relative to the import of this module, which is the first
+    import of the application. Mark ends a phase of the GUI thread that
+    started at the previous mark, Measure times a phase in the background.
+    Finish marks the last phase of the GUI thread, which also started at the
+    previous mark. The start is finished when that phase and the Expected
+    background phases have ended, then the phases are printed when enabled.
+    Phases after that (e.g. of another exchange) aren't recorded.
+    """
+    enabled = False
+    finished = False
+    __start = time.perf_counter()
+    __last = 0.
+    __phases = list()
+    # the last phase of the GUI thread has been marked
+    __marked = False
+    # background phases that haven't ended yet
+    __pending = set()
+    __lock = threading.Lock()
+
+    @classmethod
+    def __Now(cls) -> float:
+        return time.perf_counter() - cls.__start
+
+    @classmethod
+    def Mark(cls, phase: str) -> None:
+        if not cls.__marked:
+            now = cls.__Now()
+            cls.__phases.append((phase, cls.__last, now))
+            cls.__last = now
+
+    @classmethod
+    def Expect(cls, *phases: str) -> None:
+        """The start isn't finished before these background phases have been measured"""
+        with cls.__lock:
+            if not cls.finished:
+                cls.__pending.update(phases)
+
+    @classmethod
+    @contextmanager
+    def Measure(cls, phase: str):
+        start = cls.__Now()
+        try:
+            yield
+        finally:
+            with cls.__lock:
+                if not cls.finished:
+                    cls.__phases.append((f"{phase} (background)", start, cls.__Now()))
+                    cls.__pending.discard(phase)
+            cls.__Complete()
+
+    @classmethod
+    def Finish(cls, phase: str) -> None:
+        with cls.__lock:
+            if cls.__marked:
+                return
+            now = cls.__Now()
+            cls.__phases.append((phase, cls.__last, now))
+            cls.__last = now
+            cls.__marked = True
+        cls.__Complete()
+
+    @classmethod
+    def __Complete(cls) -> None:
+        with cls.__lock:
+            if cls.finished or not cls.__marked or cls.__pending:
+                return
+            cls.finished = True
+        if cls.enabled:
+            cls.Report()
+
+    @classmethod
+    def Report(cls) -> None:
+        print(f"{'startup phase':<32}{'start':>10}{'end':>10}{'duration':>10} [ms]")
+        for phase, start, end in sorted(cls.__phases, key=lambda phase: phase[2]):
+            print(f"{phase:<32}{start * 1000:>10.0f}{end * 1000:>10.0f}{(end - start) * 1000:>10.0f}")
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+# Streaming of the market data over the websocket api of the exchange.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Streaming of the market data over the websocket api of the exchange
+"""
+
+__all__ = ["MarketStream", "IsStreamingSupported"]
+
+import asyncio
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+@lru_cache(maxsize=None)
+def _CcxtPro():
+    """ccxt.pro, None when it isn't installed. Imported on first use, it's only needed when streaming"""
+    try:
+        import ccxt.pro as ccxtpro
+    except ImportError:
+        return None
+    return ccxtpro
+
+
+def IsStreamingSupported(exchId: str) -> bool:
+    """True when ccxt has a websocket implementation of the exchange"""
+    ccxtpro = _CcxtPro()
+    return ccxtpro is not None and exchId in ccxtpro.exchanges
+
+
+class MarketStream(QThread):
+    """Runs an asyncio loop with the ccxt.pro version of an exchange.
+
+    The watched tickers and candles are emitted through tickersReceived and
+    candlesReceived. When the connection is lost the watchers retry with a
+    back off and close the gap over the REST api of the exchange.
+    """
+    tickersReceived = pyqtSignal(dict)
+    candlesReceived = pyqtSignal(str, str, list)
+
+    # Seconds to wait before the first retry, it doubles on every failure up to MAX_BACKOFF
+    MIN_BACKOFF = 1.
+    MAX_BACKOFF = 30.
+
+    def __init__(self, exchId: str, options: Dict, candleCache=None, parent=None):
+        super().__init__(parent)
+        self.__exchId = exchId
+        self.__options = options
+        self.__candleCache = candleCache
+        self.__tickerSymbols = list()
+        self.__candles = None
+        self.__running = True
+        self.__stopped = None
+        self.__changed = None
+        self.__loop = asyncio.new_event_loop()
+
+    def WatchTickers(self, symbols: Iterable[str]) -> None:
+        """Replace the symbols of which the tickers are watched"""
+        self.__tickerSymbols = list(symbols)
+        self.__loop.call_soon_threadsafe(self.__OnChanged)
+
+    def WatchOhlcv(self, symbol: Optional[str], timeframe: Optional[str]) -> None:
+        """Replace the watched candles, None stops watching"""
+        self.__candles = (symbol, timeframe) if symbol is not None else None
+        self.__loop.call_soon_threadsafe(self.__OnChanged)
+
+    def Stop(self) -> None:
+        """Stop the stream and wait for the thread to finish"""
+        if self.isRunning():
+            self.__loop.call_soon_threadsafe(self.__OnStop)
+            self.wait()
+
+    def run(self):
+        asyncio.set_event_loop(self.__loop)
+        try:
+            self.__loop.run_until_complete(self.__Main())
+        finally:
+            self.__loop.close()
+
+    def __OnChanged(self):
+        if self.__changed is not None:
+            # wakes up all watchers that wait for a change
+            self.__changed.set()
+            self.__changed.clear()
+
+    def __OnStop(self):
+        self.__running = False
+        if self.__stopped is not None:
+            self.__stopped.set()
+
+    async def __Main(self):
+        self.__stopped = asyncio.Event()
+        self.__changed = asyncio.Event()
+        if not self.__running:
+            return
+
+        exchange = getattr(_CcxtPro(), self.__exchId)(self.__options)
+        tasks = list()
+        if exchange.has.get('watchTickers'):
+            tasks.append(asyncio.ensure_future(self.__WatchTickers(exchange)))
+        if exchange.has.get('watchOHLCV'):
+            tasks.append(asyncio.ensure_future(self.__WatchCandles(exchange)))
+        try:
+            await self.__stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await exchange.close()
+
+    async def __UntilChanged(self, coroutine):
+        """Await the coroutine, but give up when the subscriptions change. Returns None when given up."""
+        task = asyncio.ensure_future(coroutine)
+        changed = asyncio.ensure_future(self.__changed.wait())
+        try:
+            done, _pending = await asyncio.wait({task, changed}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            changed.cancel()
+        if task in done:
+            return task.result()
+        task.cancel()
+        return None
+
+    async def __WatchTickers(self, exchange):
+        backoff = self.MIN_BACKOFF
+        reconnecting = False
+        while self.__running:
+            symbols = self.__tickerSymbols
+            if not symbols:
+                await self.__changed.wait()
+                continue
+            try:
+                if reconnecting and exchange.has.get('fetchTickers'):
+                    # close the gap over REST, the stream only sends changes
+                    tickers = await exchange.fetch_tickers(symbols)
+                else:
+                    tickers = await self.__UntilChanged(exchange.watch_tickers(symbols))
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                print(f"ticker stream of {self.__exchId} failed with: {err}")
+                reconnecting = True
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+                continue
+
+            backoff = self.MIN_BACKOFF
+            reconnecting = False
+            if tickers:
+                self.tickersReceived.emit(dict(tickers))
+
+    async def __WatchCandles(self, exchange):
+        backoff = self.MIN_BACKOFF
+        last = None
+        gapSince = None
+        while self.__running:
+            subscription = self.__candles
+            if subscription is None:
+                await self.__changed.wait()
+                continue
+            symbol, timeframe = subscription
+            if last is not None and last[0] != subscription:
+                last = None
+                gapSince = None
+            try:
+                if gapSince is not None:
+                    # close the gap of the lost connection over REST
+                    ohlcv = await exchange.fetch_ohlcv(symbol, timeframe, since=gapSince)
+                else:
+                    ohlcv = await self.__UntilChanged(exchange.watch_ohlcv(symbol, timeframe))
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                print(f"candle stream {symbol} {timeframe} of {self.__exchId} failed with: {err}")
+                if last is not None:
+                    gapSince = last[1]
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+                continue
+
+            backoff = self.MIN_BACKOFF
+            gapSince = None
+            if not ohlcv or subscription != self.__candles:
+                continue
+
+            # only pass the candles that could have changed since the previous update
+            if last is not None:
+                candles = [list(candle) for candle in ohlcv if candle[0] >= last[1]]
+            else:
+                candles = [list(ohlcv[-1])]
+            if not candles:
+                continue
+            last = (subscription, candles[-1][0])
+
+            if self.__candleCache is not None:
+                self.__candleCache.Store(self.__exchId, symbol, timeframe, candles)
+            self.candlesReceived.emit(symbol, timeframe, candles)
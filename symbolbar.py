@@ -19,16 +19,24 @@
 """
 Module to show the selected symbols in tabbed bar
 """
+import time
+
+import numpy as np
 from PyQt5 import QtWidgets, QtCore
-from PyQt5.QtGui import QColor
+from PyQt5.QtGui import QColor, QPainter, QPen, QPixmap, QPolygonF
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtWidgets import QTabBar, QWidget, QVBoxLayout, QHBoxLayout, QLabel
 
-from denariotrader import DenarioTrader, Exchange
+from denariotrader import DenarioTrader
 from config import Config
+from tickerhistory import TickerHistory
 
 class SymbolBar(QTabBar):
     symbolChanged = pyqtSignal(str)
+    # Number of recently shown symbols of which the candles are prefetched
+    PREFETCH_RECENT = 3
+    # Changed tickers are collected and shown at most once per interval [ms]
+    UPDATE_INTERVAL = 300
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -44,6 +52,17 @@ class SymbolBar(QTabBar):
         self.tabMoved.connect(self.OnTabMoved)
         self.currentChanged.connect(self.__OnCurrentChanged)
         self.__symbolWidgets = dict()
+        # the shown symbols, most recent first
+        self.__recent = list()
+        # symbols of which the ticker changed since the last update
+        self.__dirty = set()
+        # recent prices of the symbols of the tabs, sampled from the received tickers
+        self.__history = TickerHistory()
+        self.__updateTimer = QtCore.QTimer(self)
+        self.__updateTimer.setSingleShot(True)
+        self.__updateTimer.setInterval(self.UPDATE_INTERVAL)
+        self.__updateTimer.timeout.connect(self.__UpdateTabs)
+        self.__trader.tickers.tickersChanged.connect(self.__OnTickersChanged)
 
         self.__LoadSymbols()
 
@@ -64,6 +83,9 @@ class SymbolBar(QTabBar):
         opt = QtWidgets.QStyleOptionTab()
 
         for i in range(self.count()):
+            if not event.rect().intersects(self.tabRect(i)):
+                # only the tabs of which the symbol changed are repainted
+                continue
             self.initStyleOption(opt, i)
             painter.drawControl(QtWidgets.QStyle.CE_TabBarTabShape, opt)
             painter.save()
@@ -82,6 +104,34 @@ class SymbolBar(QTabBar):
             painter.drawControl(QtWidgets.QStyle.CE_TabBarTabLabel, opt)
             painter.restore()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.__dirty:
+            self.__updateTimer.start()
+
+    @pyqtSlot(set)
+    def __OnTickersChanged(self, symbols: set):
+        now = time.time()
+        tickers = self.__trader.tickers
+        for symbol in symbols:
+            if symbol in self.__symbolWidgets:
+                ticker = tickers.get(symbol)
+                if ticker is not None:
+                    self.__history.Append(symbol, now, ticker.get('last'))
+                self.__dirty.add(symbol)
+        if self.__dirty and not self.__updateTimer.isActive():
+            self.__updateTimer.start()
+
+    def __UpdateTabs(self):
+        """Show the changed tickers of all tabs at once, paused while the bar is hidden"""
+        if not self.isVisible():
+            return
+        dirty, self.__dirty = self.__dirty, set()
+        for symbol in dirty:
+            widget = self.__symbolWidgets.get(symbol)
+            if widget is not None:
+                widget.OnUpdateStats()
+
     @pyqtSlot(int)
     def OnCloseTab (self, currentIndex: int):
         widget = self.tabButton(currentIndex, QTabBar.LeftSide)
@@ -89,9 +139,12 @@ class SymbolBar(QTabBar):
         if widget.symbol in self.__config['denario']['symbolbar'][exchange]:
             self.__config['denario']['symbolbar'][exchange].remove(widget.symbol)
             Config.Save()
+            self.__trader.WatchTickers(self.__config['denario']['symbolbar'][exchange])
         #currentQWidget = self.widget(currentIndex)
         #currentQWidget.deleteLater()
-        self.__trader.timer.timeout.disconnect(widget.OnUpdateStats)
+        self.__symbolWidgets.pop(widget.symbol, None)
+        self.__dirty.discard(widget.symbol)
+        self.__history.Remove(widget.symbol)
 
         self.removeTab(currentIndex)
 
@@ -107,8 +160,8 @@ class SymbolBar(QTabBar):
     def AddSymbol(self, symbol: str) -> int:
         print(f"Adding Symbol {symbol}")
 
-        symbolWidget = TabSymbolWidget(symbol)
-        self.__trader.timer.timeout.connect(symbolWidget.OnUpdateStats)
+        symbolWidget = TabSymbolWidget(symbol, self.__history)
+        self.__symbolWidgets[symbol] = symbolWidget
 
         index = self.addTab(None)
         self.setTabButton(index, QTabBar.LeftSide, symbolWidget)
@@ -116,6 +169,7 @@ class SymbolBar(QTabBar):
         if symbol not in self.__config['denario']['symbolbar'][exchange]:
             self.__config['denario']['symbolbar'][exchange].append(symbol)
         Config.Save()
+        self.__trader.WatchTickers(self.__config['denario']['symbolbar'][exchange])
         return index
 
     @pyqtSlot(str)
@@ -134,10 +188,28 @@ class SymbolBar(QTabBar):
         symbolWidget = self.tabButton(currentIndex, QTabBar.LeftSide)
         if symbolWidget is not None and not self.__updating:
             self.symbolChanged.emit(symbolWidget.symbol)
-
-    @pyqtSlot(Exchange)
+            self.__Prefetch(currentIndex)
+
+    def __Prefetch(self, currentIndex: int):
+        """Prefetch the candles of the neighbouring tabs and the recently shown symbols"""
+        symbol = self.tabButton(currentIndex, QTabBar.LeftSide).symbol
+        if symbol in self.__recent:
+            self.__recent.remove(symbol)
+        self.__recent.insert(0, symbol)
+        del self.__recent[self.PREFETCH_RECENT + 1:]
+
+        symbols = list()
+        for index in (currentIndex + 1, currentIndex - 1):
+            widget = self.tabButton(index, QTabBar.LeftSide) if 0 <= index < self.count() else None
+            if widget is not None:
+                symbols.append(widget.symbol)
+        symbols.extend(self.__recent[1:])
+        self.__trader.Prefetch(other for other in symbols if other != symbol)
+
+    @pyqtSlot(object)
     def OnExchangeChanged(self, exchange):
         self.__updating = True
+        self.__recent.clear()
         while self.count():
             self.OnCloseTab(0)
         self.__updating = False
@@ -145,9 +217,36 @@ class SymbolBar(QTabBar):
         self.__OnCurrentChanged(0)
 
 
+class SparklineLabel(QLabel):
+    """Line of the recent prices, drawn once per new sample into the pixmap of the label"""
+    WIDTH = 100
+    HEIGHT = 16
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setFixedSize(self.WIDTH, self.HEIGHT)
+
+    def Draw(self, times: np.ndarray, prices: np.ndarray, color: QColor) -> None:
+        pixmap = QPixmap(self.WIDTH, self.HEIGHT)
+        pixmap.fill(Qt.transparent)
+        if len(prices) > 1:
+            timeRange = max(times[-1] - times[0], 1.)
+            priceRange = prices.max() - prices.min() or 1.
+            xs = (times - times[0]) / timeRange * (self.WIDTH - 1)
+            ys = (self.HEIGHT - 1) - (prices - prices.min()) / priceRange * (self.HEIGHT - 1)
+            painter = QPainter(pixmap)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(color, 1))
+            painter.drawPolyline(QPolygonF([QtCore.QPointF(x, y) for x, y in zip(xs, ys)]))
+            painter.end()
+        self.setPixmap(pixmap)
+
+
 class TabSymbolWidget(QWidget):
     __colors = None
-    def __init__(self, symbol, *args, **kwargs):
+    # Period of the change computed from the sampled prices [s]
+    CHANGE_PERIOD = 60 * 60
+    def __init__(self, symbol, history: TickerHistory, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         if TabSymbolWidget.__colors is None:
@@ -156,18 +255,30 @@ class TabSymbolWidget(QWidget):
                                             negative=config['pallet']['negative'])
 
         self.__symbol = symbol
+        self.__history = history
+        # last shown values, a label is only changed when they differ
+        self.__shown = dict(price=None, percentage=None, color=None, version=None, change=None, changeColor=None)
+        self.__stale = False
 
         self.lblName = QtWidgets.QLabel(symbol)
         self.lblName.setMinimumWidth(160)
         self.lblName.setAlignment(Qt.AlignCenter)
 
         self.lblPrice = QtWidgets.QLabel("0.0")
+        self.lblPrice.setObjectName("lblPrice")
         self.lblPrice.setMinimumWidth(100)
         self.lblPrice.setAlignment(Qt.AlignLeft)
         self.lblPercentage = QtWidgets.QLabel("0.0%")
+        self.lblPercentage.setObjectName("lblPercentage")
         self.lblPercentage.setMinimumWidth(60)
         self.lblPercentage.setAlignment(Qt.AlignRight)
 
+        self.lblSparkline = SparklineLabel()
+        self.lblChange = QtWidgets.QLabel("")
+        self.lblChange.setMinimumWidth(60)
+        self.lblChange.setAlignment(Qt.AlignRight)
+        self.lblChange.setToolTip("Change of the last hour")
+
         # Create layout
         self.vLayout = QVBoxLayout()
         self.vLayout.setSpacing(0)
@@ -181,30 +292,66 @@ class TabSymbolWidget(QWidget):
         self.hLayout.addWidget(self.lblPrice)
         self.hLayout.addWidget(self.lblPercentage)
         self.vLayout.addLayout(self.hLayout)
+        self.hLayoutHistory = QHBoxLayout()
+        self.hLayoutHistory.setSpacing(0)
+        self.hLayoutHistory.setContentsMargins(0, 0, 0, 0)
+        self.hLayoutHistory.addWidget(self.lblSparkline)
+        self.hLayoutHistory.addWidget(self.lblChange)
+        self.vLayout.addLayout(self.hLayoutHistory)
 
         self.setLayout(self.vLayout)
 
         self.OnUpdateStats()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.__stale:
+            self.OnUpdateStats()
+
     @pyqtSlot()
     def OnUpdateStats(self):
+        if not self.isVisible():
+            # a tab that is scrolled out of the bar is updated when it's shown again
+            self.__stale = True
+            return
+        self.__stale = False
+
         trader = DenarioTrader.GetInstance()
         try:
             ticker = trader.tickers[self.__symbol]
-            self.lblPrice.setText(f"{ticker['last']}")
-            if ticker['percentage'] != None:
-                self.lblPercentage.setText(f"{ticker['percentage']:.1f}%")
-            else:
-                self.lblPercentage.setText("")
-            if ticker['change'] != None:
-                color = self.__colors['positive'] if ticker['change'] >= 0 else self.__colors['negative']
-            else:
-                color = QColor(Qt.white)
-            style = "QLabel {{ color : {}; }}".format(color.name())
-            self.lblPrice.setStyleSheet(style);
-            self.lblPercentage.setStyleSheet(style);
         except KeyError:
-            pass
+            return
+        price = f"{ticker['last']}"
+        percentage = f"{ticker['percentage']:.1f}%" if ticker['percentage'] != None else ""
+        if ticker['change'] != None:
+            color = self.__colors['positive'] if ticker['change'] >= 0 else self.__colors['negative']
+        else:
+            color = QColor(Qt.white)
+        color = color.name()
+        version = self.__history.Version(self.__symbol)
+        change = self.__history.Change(self.__symbol, self.CHANGE_PERIOD, time.time())
+        if change is not None:
+            changeColor = self.__colors['positive' if change >= 0 else 'negative'].name()
+            change = f"{change:+.1f}%"
+        else:
+            changeColor = self.__shown['changeColor']
+            change = ""
+
+        if price != self.__shown['price']:
+            self.lblPrice.setText(price)
+        if percentage != self.__shown['percentage']:
+            self.lblPercentage.setText(percentage)
+        if color != self.__shown['color']:
+            # a style sheet re-polishes the labels, so only on a change of direction
+            self.setStyleSheet(f"QLabel#lblPrice, QLabel#lblPercentage {{ color : {color}; }}")
+        if version != self.__shown['version'] or color != self.__shown['color']:
+            self.lblSparkline.Draw(*self.__history.Samples(self.__symbol), QColor(color))
+        if change != self.__shown['change']:
+            self.lblChange.setText(change)
+        if changeColor != self.__shown['changeColor']:
+            self.lblChange.setStyleSheet(f"QLabel {{ color : {changeColor}; }}")
+        self.__shown = dict(price=price, percentage=percentage, color=color,
+                            version=version, change=change, changeColor=changeColor)
 
     @property
     def symbol(self):
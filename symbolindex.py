@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# Substring search over the markets of an exchange.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Substring search over the markets of an exchange
+"""
+
+__all__ = ["SymbolIndex"]
+
+from collections import defaultdict
+from typing import Dict, Set
+
+
+class SymbolIndex:
+    """Search index over the symbol, id, base and quote of the active markets.
+
+    Every substring of up to GRAM characters points to the symbols that
+    contain it, so a short query is a single lookup. A longer query
+    intersects the symbols of its grams and checks the remaining candidates.
+    A query that extends the previous one only filters the previous result.
+    """
+    GRAM = 3
+
+    def __init__(self, markets: Dict):
+        # symbol -> searchable text
+        self.__texts = dict()
+        self.__grams = defaultdict(set)
+        for symbol, market in markets.items():
+            if not market.get('active'):
+                continue
+            text = " ".join(part for part in (symbol, market.get('id'), market.get('base'), market.get('quote'))
+                            if part).upper()
+            self.__texts[symbol] = text
+            for size in range(1, self.GRAM + 1):
+                for start in range(len(text) - size + 1):
+                    self.__grams[text[start:start + size]].add(symbol)
+
+        self.__previous = ("", frozenset(self.__texts))
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.__texts
+
+    def Matches(self, symbol: str, query: str) -> bool:
+        """True when the (upper case) query is part of the text of the symbol"""
+        text = self.__texts.get(symbol)
+        return text is not None and query in text
+
+    def Search(self, query: str) -> Set[str]:
+        """Symbols of which the text contains the (upper case) query"""
+        previous, result = self.__previous
+        if query == previous:
+            return result
+        # a refinement of the previous query can only match the previous matches
+        candidates = result if previous in query else None
+
+        if not query:
+            result = self.__texts.keys()
+        elif len(query) <= self.GRAM:
+            result = self.__grams.get(query, frozenset())
+        elif candidates is not None:
+            result = {symbol for symbol in candidates if query in self.__texts[symbol]}
+        else:
+            grams = sorted((self.__grams.get(query[start:start + self.GRAM], frozenset())
+                            for start in range(len(query) - self.GRAM + 1)), key=len)
+            result = {symbol for symbol in grams[0].intersection(*grams[1:]) if query in self.__texts[symbol]}
+
+        result = frozenset(result)
+        self.__previous = (query, result)
+        return result
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# Tests of the timeframe resampling.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+CanResample over the timeframes of the exchanges of ccxt
+"""
+
+import pytest
+
+ccxt = pytest.importorskip("ccxt")
+
+from resample import CanResample, CountBuckets
+
+
+def test_can_resample_known_pairs():
+    assert CanResample('1h', '4h')
+    assert CanResample('1h', '1d')
+    assert CanResample('1d', '1w')
+    assert CanResample('1M', '3M')
+    assert not CanResample('4h', '1h')
+    assert not CanResample('1w', '1M')
+    assert not CanResample('1y', '4h')
+    assert not CanResample('4h', '1Y')
+    assert not CanResample('15', '30')
+
+
+def test_count_buckets():
+    hour = 60 * 60 * 1000
+    assert CountBuckets(0, 12 * hour, '4h') == 3
+    assert CountBuckets(0, 0, '1d') == 0
+    # 1970-01 till 1970-04
+    assert CountBuckets(0, 90 * 24 * hour, '1M') == 3
+
+
+@pytest.mark.parametrize("exchId", ccxt.exchanges)
+def test_can_resample_exchange_timeframes(exchId):
+    """Every pair of timeframes an exchange lists is answered, none raises"""
+    timeframes = getattr(ccxt, exchId)().timeframes or dict()
+    for source in timeframes:
+        for target in timeframes:
+            assert CanResample(source, target) in (True, False)
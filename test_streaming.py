@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+#
+# Tests of the websocket streaming against a local stand-in server.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+MarketStream against a local websocket server that speaks the okx protocol
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+ccxtpro = pytest.importorskip("ccxt.pro")
+serve = pytest.importorskip("websockets.asyncio.server").serve
+
+from PyQt5.QtCore import QCoreApplication, Qt
+
+from candlecache import CandleCache
+from streaming import MarketStream
+
+MINUTE = 60 * 1000
+T0 = 1600000000000
+MARKETS = {'BTC/USDT': {'id': 'BTC-USDT', 'symbol': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT',
+                        'baseId': 'BTC', 'quoteId': 'USDT', 'type': 'spot', 'spot': True, 'active': True}}
+
+
+def Candle(timestamp: int, close: float):
+    return [str(timestamp), "100", "110", "90", str(close), "5", "500", "500", "0"]
+
+
+class StandInServer:
+    """Answers the subscriptions of the okx websocket api in a thread of its own.
+
+    candles are the candle messages of the consecutive connections to the
+    business endpoint, after sending them the connection is closed unless
+    it's the last one.
+    """
+
+    def __init__(self, candles=()):
+        self.candles = list(candles)
+        # (path, time) of every connection
+        self.connections = list()
+        self.__loop = asyncio.new_event_loop()
+        self.__started = threading.Event()
+        self.__thread = threading.Thread(target=self.__Run, daemon=True)
+
+    def __enter__(self):
+        self.__thread.start()
+        self.__started.wait(5)
+        return self
+
+    def __exit__(self, *exc):
+        self.__loop.call_soon_threadsafe(self.__stop.set_result, None)
+        self.__thread.join(5)
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws/v5"
+
+    def __Run(self):
+        self.__loop.run_until_complete(self.__Main())
+
+    async def __Main(self):
+        self.__stop = self.__loop.create_future()
+        async with serve(self.__Handle, "127.0.0.1", 0) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self.__started.set()
+            await self.__stop
+
+    async def __Handle(self, connection):
+        path = connection.request.path
+        self.connections.append((path, time.monotonic()))
+        candles = self.candles.pop(0) if self.candles and path.endswith("/business") else None
+        async for message in connection:
+            if message == "ping":
+                await connection.send("pong")
+                continue
+            request = json.loads(message)
+            for arg in request['args']:
+                await connection.send(json.dumps({'event': 'subscribe', 'arg': arg}))
+                if arg['channel'] == 'tickers':
+                    await connection.send(json.dumps({'arg': arg, 'data': [
+                        {'instType': 'SPOT', 'instId': arg['instId'], 'last': "31500.1",
+                         'bidPx': "31500", 'askPx': "31500.1", 'open24h': "31697", 'high24h': "32248",
+                         'low24h': "31165.6", 'vol24h': "15937.1", 'volCcy24h': "503403597.3",
+                         'ts': str(T0)}]}))
+                elif candles is not None:
+                    for candle in candles:
+                        await connection.send(json.dumps({'arg': arg, 'data': [candle]}))
+                        # updates that arrive before the next watch are merged by ccxt
+                        await asyncio.sleep(0.05)
+                    if self.candles:
+                        # the connection is lost
+                        await connection.close()
+                        return
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def Stream(server: StandInServer, cache=None) -> MarketStream:
+    stream = MarketStream('okx', {'urls': {'api': {'ws': server.url}}, 'markets': MARKETS}, cache)
+    stream.received = list()
+    stream.tickersReceived.connect(lambda tickers: stream.received.append(tickers), Qt.DirectConnection)
+    stream.candlesReceived.connect(lambda symbol, timeframe, candles:
+                                   stream.received.append((symbol, timeframe, candles)), Qt.DirectConnection)
+    return stream
+
+
+def WaitFor(condition, timeout: float = 10.):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_watch_tickers(app):
+    with StandInServer() as server:
+        stream = Stream(server)
+        stream.WatchTickers(['BTC/USDT'])
+        stream.start()
+        try:
+            WaitFor(lambda: stream.received)
+        finally:
+            stream.Stop()
+
+    tickers = stream.received[0]
+    assert list(tickers) == ['BTC/USDT']
+    assert tickers['BTC/USDT']['last'] == 31500.1
+    assert server.connections[0][0] == "/ws/v5/public"
+
+
+def test_watch_candles(app, tmp_path):
+    cache = CandleCache(str(tmp_path / "candles.sqlite"))
+    with StandInServer([[Candle(T0, 101), Candle(T0, 102), Candle(T0 + MINUTE, 103)]]) as server:
+        stream = Stream(server, cache)
+        stream.WatchOhlcv('BTC/USDT', '1m')
+        stream.start()
+        try:
+            WaitFor(lambda: any(candles[-1][0] == T0 + MINUTE for _symbol, _timeframe, candles in stream.received))
+        finally:
+            stream.Stop()
+
+    assert {(symbol, timeframe) for symbol, timeframe, _candles in stream.received} == {('BTC/USDT', '1m')}
+    # every update of the open candle is passed
+    assert [(candle[0], candle[4]) for _symbol, _timeframe, candles in stream.received for candle in candles] == \
+           [(T0, 101.), (T0, 102.), (T0 + MINUTE, 103.)]
+    assert [candle[4] for candle in cache.Load('okx', 'BTC/USDT', '1m')] == [102., 103.]
+
+
+def test_reconnect_fills_gap(app, monkeypatch):
+    calls = list()
+
+    async def FetchOhlcv(exchange, symbol, timeframe='1m', since=None, limit=None, params={}):
+        calls.append((since, time.monotonic()))
+        if len(calls) < 3:
+            raise ccxtpro.NetworkError("offline")
+        return [[T0 + i * MINUTE, 100., 110., 90., 104. + i, 5.] for i in range(3)]
+
+    monkeypatch.setattr(ccxtpro.okx, 'fetch_ohlcv', FetchOhlcv)
+    monkeypatch.setattr(MarketStream, 'MIN_BACKOFF', 0.1)
+    with StandInServer([[Candle(T0, 101)], [Candle(T0 + 3 * MINUTE, 110)]]) as server:
+        stream = Stream(server)
+        stream.WatchOhlcv('BTC/USDT', '1m')
+        stream.start()
+        try:
+            WaitFor(lambda: any(candles[-1][0] == T0 + 3 * MINUTE for _symbol, _timeframe, candles in stream.received))
+        finally:
+            stream.Stop()
+
+    # the gap since the last received candle is fetched over REST, with a doubling back off
+    assert [since for since, _time in calls] == [T0] * 3
+    assert calls[1][1] - calls[0][1] >= 0.2 * 0.9
+    assert calls[2][1] - calls[1][1] >= 0.4 * 0.9
+    gap = [candles for _symbol, _timeframe, candles in stream.received][1]
+    assert [candle[0] for candle in gap] == [T0, T0 + MINUTE, T0 + 2 * MINUTE]
+    # and the stream is subscribed again
+    assert [path for path, _time in server.connections] == ["/ws/v5/business"] * 2
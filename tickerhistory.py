@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Recent last prices of the symbols, collected from the tickers.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Recent last prices of the symbols, collected from the tickers
+"""
+
+__all__ = ["TickerHistory"]
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class TickerHistory:
+    """Ring buffer of the last SIZE (time, last price) samples per symbol.
+
+    The samples of a symbol are stored in a fixed size array, a new sample
+    overwrites the oldest one, so the memory doesn't grow with the running
+    time. There is at most one sample per RESOLUTION seconds, the last price
+    within that period replaces the price of the sample. The version of a
+    symbol changes with every change of its samples, a view compares it to
+    know whether it has to be drawn again.
+    """
+    # a trading day of samples per minute, about 23 kB per symbol
+    SIZE = 1440
+    RESOLUTION = 60
+
+    def __init__(self):
+        # symbol -> [SIZE x 2 array of time [s] and price, number of samples, version]
+        self.__buffers = dict()
+
+    def Clear(self) -> None:
+        self.__buffers.clear()
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.__buffers
+
+    def Remove(self, symbol: str) -> None:
+        self.__buffers.pop(symbol, None)
+
+    def Append(self, symbol: str, time: float, price: Optional[float]) -> bool:
+        """Add a sample, returns False when it didn't change the samples"""
+        if price is None:
+            return False
+        entry = self.__buffers.get(symbol)
+        if entry is None:
+            entry = self.__buffers[symbol] = [np.empty((self.SIZE, 2)), 0, 0]
+        buffer, count, _version = entry
+        if count:
+            last = buffer[(count - 1) % self.SIZE]
+            if last[1] == price:
+                return False
+            if time - last[0] < self.RESOLUTION:
+                last[1] = price
+                entry[2] += 1
+                return True
+        buffer[count % self.SIZE] = (time, price)
+        entry[1] += 1
+        entry[2] += 1
+        return True
+
+    def Version(self, symbol: str) -> int:
+        """Changes with every change of the samples of the symbol"""
+        entry = self.__buffers.get(symbol)
+        return entry[2] if entry is not None else 0
+
+    def Samples(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Times and prices of the symbol, oldest first"""
+        entry = self.__buffers.get(symbol)
+        if entry is None:
+            return np.empty(0), np.empty(0)
+        buffer, count, _version = entry
+        if count > self.SIZE:
+            buffer = np.roll(buffer, -(count % self.SIZE), axis=0)
+        else:
+            buffer = buffer[:count]
+        return buffer[:, 0], buffer[:, 1]
+
+    def Change(self, symbol: str, seconds: float, now: float) -> Optional[float]:
+        """Percentage change of the price over the seconds before now.
+
+        None when there are no samples from before that period, the samples
+        only start when the application is started.
+        """
+        times, prices = self.Samples(symbol)
+        if not len(times) or times[0] > now - seconds:
+            return None
+        # the price at the start of the period
+        start = np.searchsorted(times, now - seconds, side='right') - 1
+        return (prices[-1] - prices[start]) / prices[start] * 100 if prices[start] else None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Central store of the tickers of the active exchange.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Central store of the tickers of the active exchange
+"""
+
+__all__ = ["TickerStore"]
+
+from typing import Dict, Set
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class TickerStore(QObject):
+    """Holds the last received tickers and reports which symbols changed.
+
+    refreshDue is emitted every interval ms, the owner answers it by fetching
+    the tickers and passing them to Update. tickersChanged is emitted once per
+    update with the symbols of which one of the FIELDS changed.
+    """
+    tickersChanged = pyqtSignal(set)
+    refreshDue = pyqtSignal()
+
+    FIELDS = ('last', 'change', 'percentage', 'bid', 'ask', 'high', 'low', 'quoteVolume')
+
+    def __init__(self, interval: int = 5 * 60 * 1000, parent=None):
+        super().__init__(parent)
+        self.__tickers = dict()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refreshDue)
+        self.timer.start(interval)
+
+    def Update(self, tickers: Dict, replace: bool = False) -> Set[str]:
+        """Merge the received tickers with the previous ones.
+
+        :param replace: the tickers replace all previous tickers (e.g. another exchange).
+        :return: the changed symbols
+        """
+        changed = set()
+        for symbol, ticker in tickers.items():
+            previous = self.__tickers.get(symbol)
+            if previous is None or any(previous.get(field) != ticker.get(field) for field in self.FIELDS):
+                changed.add(symbol)
+
+        if replace:
+            changed.update(symbol for symbol in self.__tickers if symbol not in tickers)
+            self.__tickers = dict(tickers)
+        else:
+            self.__tickers.update(tickers)
+
+        if changed:
+            self.tickersChanged.emit(changed)
+        return changed
+
+    def __getitem__(self, symbol: str) -> Dict:
+        return self.__tickers[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.__tickers
+
+    def __iter__(self):
+        return iter(self.__tickers)
+
+    def __len__(self) -> int:
+        return len(self.__tickers)
+
+    def get(self, symbol: str, default=None):
+        return self.__tickers.get(symbol, default)
+
+    def items(self):
+        return self.__tickers.items()
+
+    def values(self):
+        return self.__tickers.values()
@@ -24,21 +24,44 @@ Provide date an time based upon the timestamps
 
 __all__ = ["DateTimeAxisItem"]
 
-from time import mktime
-from datetime import datetime, timedelta
-from numpy import ceil
+from collections import OrderedDict
+from datetime import datetime
+from math import ceil, floor
+
+import numpy as np
 
 from pyqtgraph import AxisItem
 
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+def _UtcOffset(timestamp: float) -> float:
+    """Offset in seconds of the local time at timestamp"""
+    return datetime.fromtimestamp(timestamp).astimezone().utcoffset().total_seconds()
 
 
 class DateTimeAxisItem(AxisItem):
     # Max width in pixels reserved for each label in axis
     labelWidth = 80
+    # Tick steps as (unit, amount, approximate seconds), the first that fits is used
+    STEPS = [('m', 1, MINUTE), ('m', 5, 5 * MINUTE), ('m', 15, 15 * MINUTE), ('m', 30, 30 * MINUTE),
+             ('h', 1, HOUR), ('h', 3, 3 * HOUR), ('h', 6, 6 * HOUR), ('h', 12, 12 * HOUR),
+             ('D', 1, DAY), ('D', 3, 3 * DAY), ('D', 10, 10 * DAY),
+             ('M', 1, 30.44 * DAY), ('M', 3, 91.3 * DAY), ('M', 6, 182.6 * DAY)] + \
+            [('Y', years, years * 365.25 * DAY) for years in (1, 2, 5, 10, 25, 50, 100)]
+    # Number of memoized tick lists and labels
+    MAX_TICKS = 64
+    MAX_LABELS = 4096
 
     def __init__(self, timeFrame, *args, **kwargs):
         AxisItem.__init__(self, *args, **kwargs)
         self.__timeFrame = timeFrame
+        # (step, first block, last block) -> ticks
+        self.__ticks = OrderedDict()
+        # tick -> label
+        self.__labels = dict()
 
     @property
     def timeFrame(self):
@@ -51,79 +74,83 @@ class DateTimeAxisItem(AxisItem):
         """
         Rounding around date/time values instead of decimal numbers
         """
-        maxSteps = int(size / self.labelWidth)
-
-        startTime = datetime.fromtimestamp(minVal)
-        endTime = datetime.fromtimestamp(maxVal)
-
-        dT = endTime - startTime
-        dx = maxVal - minVal
-        ticks = []
-
-        dT /= maxSteps
-        if dT < self.timeFrame:
-            # lets not set a smaller timeframe than the candles
-            dT = self.timeFrame
-
-        if dT.days > 0:
-            startTime = startTime.replace(hour=0, minute=0,
-                                          second=0, microsecond=0)
-            dT = timedelta(days=dT.days)
-            for days in (1, 3, 10, 31, 120, 180, 365):
-                if dT.days < days:
-                    dT = timedelta(days=days)
-                    dDays = timedelta(days=days - (startTime.day % days))
-                    startTime = startTime + dDays
-                    break
+        maxSteps = max(int(size / self.labelWidth), 1)
+        # lets not set a smaller step than the candles
+        wanted = max((maxVal - minVal) / maxSteps, self.timeFrame.total_seconds())
+        for step in self.STEPS:
+            if step[2] >= wanted:
+                break
+
+        # the ticks are generated for whole blocks of the range, so panning
+        # reuses them. pyqtgraph skips the ticks outside of the range.
+        block = step[2] * maxSteps
+        key = (step, floor(minVal / block), ceil(maxVal / block))
+        ticks = self.__ticks.get(key)
+        if ticks is None:
+            ticks = self.__Ticks(step, key[1] * block, key[2] * block)
+            self.__ticks[key] = ticks
+            if len(self.__ticks) > self.MAX_TICKS:
+                self.__ticks.popitem(last=False)
         else:
-            hour = dT.seconds // 3600
-            if hour > 0:
-                startTime = startTime.replace(minute=0,
-                                              second=0, microsecond=0)
-                for hours in (1, 3, 12, 24):
-                    if hour <= hours:
-                        dT = timedelta(seconds=hours * 3600)
-                        dHours = timedelta(hours=hours - (startTime.hour % hours))
-                        startTime = startTime + dHours
-                        break
-            else:
-                startTime = startTime.replace(second=0, microsecond=0)
-                minute = dT.seconds // 60
-                for minutes in (5, 15, 30, 60):
-                    if minute < minutes:
-                        dT = timedelta(seconds=minutes * 60)
-                        dMinutes = timedelta(minutes=minutes - (startTime.minute % minutes))
-                        startTime = startTime + dMinutes
-                        break
-
-        while startTime < endTime:
-            # make sure that we are on day 1 (even if always sum 31 days)
-            ticks.append(mktime(startTime.timetuple()))
-            startTime += dT
-
-        length = len(ticks)
-        if length > maxSteps:
-            majticks = ticks[::int(ceil(float(length) / maxSteps))]
-
-        return [(dT.total_seconds(), ticks)]
+            self.__ticks.move_to_end(key)
+        return [(step[2], ticks)]
+
+    @staticmethod
+    def __Ticks(step, start: float, end: float):
+        """Ticks from start till end on the local time boundaries of the step"""
+        unit, amount, seconds = step
+        offset = _UtcOffset(start)
+        start += offset
+        end += offset
+
+        if unit in ('m', 'h') or (unit == 'D' and amount == 1):
+            ticks = np.arange(ceil(start / seconds) * seconds, end, seconds)
+        elif unit == 'D':
+            # every amount days from the first of the month, skip the ones close to the next month
+            months = np.arange(np.datetime64(int(start), 's').astype('datetime64[M]'),
+                               np.datetime64(int(end), 's').astype('datetime64[M]') + 1)
+            firsts = months.astype('datetime64[D]')
+            lengths = ((months + 1).astype('datetime64[D]') - firsts).astype(np.int64)
+            days = np.arange(0, 31, amount)
+            keep = days[None, :] <= lengths[:, None] - (amount + 1) // 2
+            ticks = (firsts[:, None] + days[None, :])[keep].astype('datetime64[s]').astype(np.int64)
+        else:
+            period = 'datetime64[M]' if unit == 'M' else 'datetime64[Y]'
+            first = np.datetime64(int(start), 's').astype(period).astype(np.int64)
+            last = np.datetime64(int(end), 's').astype(period).astype(np.int64)
+            # align on multiples of amount, the years on the calendar year
+            base = 0 if unit == 'M' else 1970
+            periods = np.arange(first - (first + base) % amount, last + 1, amount)
+            ticks = periods.astype(period).astype('datetime64[s]').astype(np.int64)
+
+        # the local time offset can change within the range (daylight saving time)
+        return [tick - _UtcOffset(tick - offset) for tick in ticks[(ticks >= start) & (ticks < end)].tolist()]
 
     def tickStrings(self, values, scale, spacing):
         """Reimplemented from PlotItem to adjust to the range"""
-        ret = []
+        labels = self.__labels
+        if len(labels) > self.MAX_LABELS:
+            labels.clear()
 
+        ret = []
         for tick in values:
-            capital = False
-            tickTime = datetime.fromtimestamp(tick)
-            if tickTime.second != 0:
-                fmt = "%H:%M:%S"
-            elif tickTime.minute != 0 or tickTime.hour != 0:
-                fmt = "%H:%M"
-            elif tickTime.day != 1:
-                fmt = "%d"
-            elif tickTime.month != 1:
-                fmt = "%b"
-            else:
-                fmt = "%Y"
-            ret.append(tickTime.strftime(fmt))
-
+            label = labels.get(tick)
+            if label is None:
+                label = labels[tick] = self.__Label(tick)
+            ret.append(label)
         return ret
+
+    @staticmethod
+    def __Label(tick: float) -> str:
+        tickTime = datetime.fromtimestamp(tick)
+        if tickTime.second != 0:
+            fmt = "%H:%M:%S"
+        elif tickTime.minute != 0 or tickTime.hour != 0:
+            fmt = "%H:%M"
+        elif tickTime.day != 1:
+            fmt = "%d"
+        elif tickTime.month != 1:
+            fmt = "%b"
+        else:
+            fmt = "%Y"
+        return tickTime.strftime(fmt)
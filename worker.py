@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# Run blocking calls outside of the GUI thread.
+#
+# Copyright (C) 2020  Cedric Schmeits <cedric@aerofx.nl>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Run blocking calls outside of the GUI thread
+"""
+
+__all__ = ["Worker"]
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """Signals of a worker, QRunnable itself can't have signals"""
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    """Runs func(*args, **kwargs) in a QThreadPool.
+
+    The result is delivered through signals.finished, an exception through
+    signals.failed. As the signals object lives in the thread that created
+    the worker, the connected slots are called in that thread.
+    """
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.signals = WorkerSignals()
+        self.__func = func
+        self.__args = args
+        self.__kwargs = kwargs
+
+    def run(self):
+        try:
+            result = self.__func(*self.__args, **self.__kwargs)
+        except Exception as err:
+            print(f"{self.__func.__name__} failed with: {err}")
+            self.signals.failed.emit(err)
+        else:
+            self.signals.finished.emit(result)